@@ -10,11 +10,15 @@ from aiohttp import web
 from pyrogram.errors import BadMsgNotification
 from pyrogram.types import BotCommand
 
-from .bot import StreamBot
+from .bot import StreamBot, multi_clients
 from .vars import Var
 from .server import web_server
 from .utils.keepalive import ping_server
 from ShivamNox.bot.clients import initialize_clients
+from ShivamNox.utils.custom_dl import (
+    _disk_cache, _session_pool, warm_file_cache, cleanup_sessions
+)
+from ShivamNox.utils.database import Database
 
 # ============ LOGGING CONFIGURATION ============
 logging.basicConfig(
@@ -112,6 +116,21 @@ async def start_services():
         print("------------------ Starting Keep Alive Service ------------------")
         asyncio.create_task(ping_server())
     
+    # Indexes behind the metadata and media auth lookups
+    if Var.PERSIST_METADATA or Var.PERSIST_MEDIA_AUTH:
+        try:
+            await Database(Var.DATABASE_URL, Var.name).ensure_indexes()
+        except Exception as e:
+            logger.warning(f"Could not create indexes: {e}")
+    
+    # Chunk and metadata caches
+    await _disk_cache.load()
+    await warm_file_cache()
+    
+    # Media sessions
+    if Var.PREWARM_SESSIONS:
+        asyncio.create_task(_session_pool.warm_up(list(multi_clients.values())))
+    
     # Web server
     print('-------------------- Initializing Web Server --------------------')
     app = web.AppRunner(await web_server())
@@ -131,6 +150,9 @@ async def start_services():
     
     # THIS IS IMPORTANT - Keep bot running
     await idle()
+    
+    # Flush pending metadata and close media sessions
+    await cleanup_sessions()
 
 
 # ============ THIS IS THE CORRECT WAY TO RUN ============
@@ -6,6 +6,7 @@ from pyrogram import Client
 from ShivamNox.utils.config_parser import TokenParser
 from . import multi_clients, work_loads, StreamBot
 from .channel_fix import ensure_bin_channel
+from ShivamNox.utils.balancer import balancer
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,7 @@ async def initialize_clients():
     # Add main bot to clients
     multi_clients[0] = StreamBot
     work_loads[0] = 0
+    await balancer.register(StreamBot)
     
     # Parse additional tokens
     all_tokens = TokenParser().parse_from_env()
@@ -70,6 +72,7 @@ async def initialize_clients():
         if result:
             client_id, client = result
             multi_clients[client_id] = client
+            await balancer.register(client)
     
     if len(multi_clients) > 1:
         Var.MULTI_CLIENT = True
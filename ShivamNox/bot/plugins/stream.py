@@ -6,11 +6,13 @@ from ShivamNox.bot import StreamBot
 from ShivamNox.utils.database import Database
 from ShivamNox.utils.human_readable import humanbytes
 from ShivamNox.vars import Var
-from urllib.parse import quote_plus
+from urllib.parse import quote, quote_plus
 from pyrogram import filters, Client
 from pyrogram.errors import FloodWait, UserNotParticipant
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from ShivamNox.utils.file_properties import get_name, get_hash, get_media_file_size
+from ShivamNox.utils.file_properties import get_name, get_hash, get_media_file_size, get_mime_type
+from ShivamNox.utils.link_token import sign_link
+from ShivamNox.utils.time_format import get_readable_time
 
 db = Database(Var.DATABASE_URL, Var.name)
 
@@ -41,6 +43,22 @@ async def cache_channel(c: Client):
         _channel_cached = True  # Don't retry on error
 
 
+def get_online_link(log_msg: Message) -> str:
+    """Download link; a signed v2 link when SIGNED_LINKS is on"""
+    if Var.SIGNED_LINKS:
+        token = sign_link(log_msg.id, get_media_file_size(log_msg), get_mime_type(log_msg), Var.LINK_TTL)
+        name = get_name(log_msg)
+        return f"{Var.URL}v2/{token}" + (f"/{quote(name)}" if name else "")
+    return f"{Var.URL}dl/{str(log_msg.id)}?hash={get_hash(log_msg)}"
+
+
+def link_expiry_note() -> str:
+    """Signed download links stop working after LINK_TTL; hashed links never do"""
+    if Var.SIGNED_LINKS and Var.LINK_TTL > 0:
+        return f"DOWNLOAD LINK EXPIRES IN {get_readable_time(Var.LINK_TTL)}"
+    return "LINK WILL NEVER EXPIRE"
+
+
 @StreamBot.on_message((filters.regex("login🔑") | filters.command("login")), group=4)
 async def login_handler(c: Client, m: Message):
     try:
@@ -127,9 +145,9 @@ async def private_receive_handler(c: Client, m: Message):
     try:
         log_msg = await m.forward(chat_id=Var.BIN_CHANNEL)
         stream_link = f"{Var.URL}watch/{str(log_msg.id)}?hash={get_hash(log_msg)}"
-        online_link = f"{Var.URL}dl/{str(log_msg.id)}?hash={get_hash(log_msg)}"
+        online_link = get_online_link(log_msg)
         
-        msg_text = """<i><u>𝗬𝗼𝘂𝗿 𝗟𝗶𝗻𝗸 𝗚𝗲𝗻𝗲𝗿𝗮𝘁𝗲𝗱 !</u></i>\n\n<b>📂 Fɪʟᴇ ɴᴀᴍᴇ :</b> <i>{}</i>\n\n<b>📦 Fɪʟᴇ ꜱɪᴢᴇ :</b> <i>{}</i>\n\n<b>📥 Dᴏᴡɴʟᴏᴀᴅ :</b> <i>{}</i>\n\n<b> 🖥WATCH  :</b> <i>{}</i>\n\n<b>🚸 Nᴏᴛᴇ : LINK WILL NEVER EXPIRE</b>"""
+        msg_text = """<i><u>𝗬𝗼𝘂𝗿 𝗟𝗶𝗻𝗸 𝗚𝗲𝗻𝗲𝗿𝗮𝘁𝗲𝗱 !</u></i>\n\n<b>📂 Fɪʟᴇ ɴᴀᴍᴇ :</b> <i>{}</i>\n\n<b>📦 Fɪʟᴇ ꜱɪᴢᴇ :</b> <i>{}</i>\n\n<b>📥 Dᴏᴡɴʟᴏᴀᴅ :</b> <i>{}</i>\n\n<b> 🖥WATCH  :</b> <i>{}</i>\n\n<b>🚸 Nᴏᴛᴇ : {}</b>"""
         
         await log_msg.reply_text(
             text=f"**RᴇQᴜᴇꜱᴛᴇᴅ ʙʏ :** [{m.from_user.first_name}](tg://user?id={m.from_user.id})\n**Uꜱᴇʀ ɪᴅ :** `{m.from_user.id}`\n**Stream ʟɪɴᴋ :** {stream_link}",
@@ -137,7 +155,7 @@ async def private_receive_handler(c: Client, m: Message):
             quote=True
         )
         await m.reply_text(
-            text=msg_text.format(get_name(log_msg), humanbytes(get_media_file_size(m)), online_link, stream_link),
+            text=msg_text.format(get_name(log_msg), humanbytes(get_media_file_size(m)), online_link, stream_link, link_expiry_note()),
             quote=True,
             disable_web_page_preview=True,
             reply_markup=InlineKeyboardMarkup(
@@ -181,7 +199,7 @@ async def channel_receive_handler(bot, broadcast):
         
         log_msg = await broadcast.forward(chat_id=Var.BIN_CHANNEL)
         stream_link = f"{Var.URL}watch/{str(log_msg.id)}?hash={get_hash(log_msg)}"
-        online_link = f"{Var.URL}dl/{str(log_msg.id)}?hash={get_hash(log_msg)}"
+        online_link = get_online_link(log_msg)
         
         await log_msg.reply_text(
             text=f"**Channel Name:** `{broadcast.chat.title}`\n**CHANNEL ID:** `{broadcast.chat.id}`\n**Rᴇǫᴜᴇsᴛ ᴜʀʟ:** {stream_link}",
@@ -2,30 +2,56 @@
 # Based on megadlbot_oss
 
 import re
-import time
 import math
+import time
 import logging
 import secrets
 import mimetypes
-import asyncio
+from email.utils import formatdate
+from typing import List, Optional, Tuple
 from aiohttp import web
 from aiohttp.http_exceptions import BadStatusLine
+from pyrogram.file_id import FileId
 from ShivamNox.bot import multi_clients, work_loads, StreamBot
 from ShivamNox.server.exceptions import FIleNotFound, InvalidHash
 from ShivamNox import StartTime, __version__
 from ..utils.time_format import get_readable_time
-from ..utils.custom_dl import ByteStreamer
-from ShivamNox.utils.render_template import render_page
+from ..utils.cooldown import cooldowns
+from ..utils.balancer import balancer
+from ..utils.file_properties import message_batcher
+from ..utils.link_token import LinkToken, verify_link
+from ..utils.byte_range import (
+    multipart_body,
+    multipart_length,
+    parse_range,
+    plan_parts,
+    splice_body,
+)
+from ..utils.container_index import container_index
+from ..utils.admission import StreamTicket, admission, client_ip
+from ..utils.shaping import ShapedStream, shaper
+from ..utils.custom_dl import (
+    get_streamer,
+    active_streams,
+    failover_stats,
+    fetch_stats,
+    _disk_cache,
+    _single_flight,
+    _session_pool,
+    _metadata_store,
+    _file_cache,
+    _negative_cache,
+    _stream_budget,
+    reject_known_bad,
+    get_verified_file,
+)
+from ShivamNox.utils.page_cache import page_cache, pick_encoding
 from ShivamNox.vars import Var
 
 logger = logging.getLogger(__name__)
 
 routes = web.RouteTableDef()
 
-# Connection tracking
-active_connections = 0
-MAX_CONNECTIONS = 100  # Adjust based on your server capacity
-
 
 @routes.get("/", allow_head=True)
 async def root_route_handler(_):
@@ -35,13 +61,30 @@ async def root_route_handler(_):
             "uptime": get_readable_time(time.time() - StartTime),
             "telegram_bot": "@" + StreamBot.username,
             "connected_bots": len(multi_clients),
-            "active_streams": active_connections,
+            "active_streams": admission.active,
             "loads": dict(
                 ("bot" + str(c + 1), l)
                 for c, (_, l) in enumerate(
                     sorted(work_loads.items(), key=lambda x: x[1], reverse=True)
                 )
             ),
+            "streams": list(active_streams.values()),
+            "disk_cache": _disk_cache.stats(),
+            "single_flight": _single_flight.stats(),
+            "media_sessions": _session_pool.stats(),
+            "failovers": failover_stats,
+            "minimal_fetch": fetch_stats,
+            "container_index": container_index.stats(),
+            "file_cache": _file_cache.stats(),
+            "negative_cache": _negative_cache.stats(),
+            "metadata_store": _metadata_store.stats(),
+            "metadata_batches": message_batcher.stats(),
+            "cooldowns": cooldowns.snapshot(),
+            "balancer": balancer.scores(),
+            "admission": admission.stats(),
+            "stream_buffers": _stream_budget.stats(),
+            "shaping": shaper.stats(),
+            "page_cache": page_cache.stats(),
             "version": __version__,
         }
     )
@@ -50,7 +93,7 @@ async def root_route_handler(_):
 @routes.get("/health", allow_head=True)
 async def health_check(_):
     """Health check endpoint"""
-    return web.json_response({"status": "healthy", "connections": active_connections})
+    return web.json_response({"status": "healthy", "connections": admission.active})
 
 
 @routes.get(r"/watch/{path:\S+}", allow_head=True)
@@ -61,19 +104,28 @@ async def watch_handler(request: web.Request):
         if path.lower() == "favicon.ico":
             return web.Response(status=204)
 
-        match = re.search(r"^([a-zA-Z0-9_-]{6})(\d+)$", path)
-        if match:
-            secure_hash = match.group(1)
-            id = int(match.group(2))
-        else:
-            match = re.search(r"(\d+)(?:\/\S+)?", path)
-            if not match:
-                raise web.HTTPBadRequest(text="Invalid URL format")
-            id = int(match.group(1))
-            secure_hash = request.rel_url.query.get("hash")
+        id, secure_hash = _parse_path(request, path)
+        
+        reject_known_bad(id, secure_hash)
+        page = await page_cache.get(id, secure_hash)
         
-        html = await render_page(id, secure_hash)
-        return web.Response(text=html, content_type='text/html')
+        encoding = pick_encoding(request.headers.get("Accept-Encoding", ""))
+        headers = {
+            "ETag": page.etag_for(encoding),
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "public, max-age=300",
+        }
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and page.matches(if_none_match, encoding):
+            return web.Response(status=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return web.Response(
+            body=page.variants[encoding],
+            content_type="text/html",
+            charset="utf-8",
+            headers=headers,
+        )
     
     except InvalidHash as e:
         raise web.HTTPForbidden(text=e.message)
@@ -87,35 +139,97 @@ async def watch_handler(request: web.Request):
         raise web.HTTPInternalServerError(text="Server error")
 
 
-@routes.get(r"/{path:\S+}", allow_head=True)
-async def generic_stream_handler(request: web.Request):
-    global active_connections
+@routes.get(r"/index/{path:\S+}")
+async def index_handler(request: web.Request):
+    """Container summary of a file, and the byte offset for ?t=<seconds>"""
+    try:
+        id, secure_hash = _parse_path(request, request.match_info["path"])
+        seconds = request.rel_url.query.get("t")
+        if seconds is not None:
+            try:
+                seconds = float(seconds)
+            except ValueError:
+                raise web.HTTPBadRequest(text="Invalid time")
+            if not math.isfinite(seconds):
+                raise web.HTTPBadRequest(text="Invalid time")
+        
+        reject_known_bad(id, secure_hash)
+        file_id = await get_verified_file(id, secure_hash)
+        _, client = balancer.pick(file_id.dc_id)
+        index = await container_index.index(file_id, await get_streamer(client or multi_clients.get(0)))
+        if index is None:
+            if container_index.enabled and container_index.indexable(file_id):
+                raise web.HTTPServiceUnavailable(text="Could not read the file, try again")
+            raise web.HTTPNotFound(text="Not an indexable video")
+        
+        result = index.summary()
+        if seconds is not None:
+            result["offset"] = index.offset_for(seconds)
+        return web.json_response(result)
+    
+    except InvalidHash as e:
+        raise web.HTTPForbidden(text=e.message)
+    except FIleNotFound as e:
+        raise web.HTTPNotFound(text=e.message)
+
+
+@routes.get(r"/v2/{token}", allow_head=True)
+@routes.get(r"/v2/{token}/{name}", allow_head=True)
+async def signed_stream_handler(request: web.Request):
+    """v2 links carry a signed token, so HEAD and bad ranges never reach Telegram"""
+    token = verify_link(request.match_info["token"])
+    if token is None:
+        raise web.HTTPForbidden(text="Invalid or expired link")
+    
+    etag, mtime = _token_validators(token)
+    not_modified = _not_modified(request, etag, mtime)
+    if not_modified is not None:
+        return not_modified
     
-    # Check connection limit
-    if active_connections >= MAX_CONNECTIONS:
+    ranges = _byte_ranges(request, token.size, _is_partial(request, etag, mtime))
+    if ranges is None:
+        return _range_not_satisfiable(token.size)
+    
+    if request.method == "HEAD":
+        mime_type, file_name = _name_and_mime(
+            token.mime, _clean_name(request.match_info.get("name", ""))
+        )
         return web.Response(
-            status=503,
-            text="Server busy, please try again later",
-            headers={"Retry-After": "30"}
+            status=206 if ranges else 200,
+            headers=_stream_headers(
+                mime_type, file_name, ranges, token.size, etag, mtime, _boundary(ranges)
+            ),
         )
     
+    try:
+        reject_known_bad(token.id, None)
+        return await media_streamer(request, token.id, None, token)
+    except FIleNotFound as e:
+        raise web.HTTPNotFound(text=e.message)
+    except (AttributeError, BadStatusLine, ConnectionResetError,
+            BrokenPipeError, ConnectionError, OSError):
+        return web.Response(status=499)
+    except Exception as e:
+        logger.error(f"Stream error: {e}")
+        raise web.HTTPInternalServerError(text="Server error")
+
+
+@routes.get(r"/{path:\S+}", allow_head=True)
+async def generic_stream_handler(request: web.Request):
     try:
         path = request.match_info["path"]
 
         if path.lower() == "favicon.ico":
             return web.Response(status=204)
 
-        match = re.search(r"^([a-zA-Z0-9_-]{6})(\d+)$", path)
-        if match:
-            secure_hash = match.group(1)
-            id = int(match.group(2))
-        else:
-            match = re.search(r"(\d+)(?:\/\S+)?", path)
-            if not match:
-                raise web.HTTPBadRequest(text="Invalid URL format")
-            id = int(match.group(1))
-            secure_hash = request.rel_url.query.get("hash")
+        id, secure_hash = _parse_path(request, path)
 
+        reject_known_bad(id, secure_hash)
+        
+        # HEAD only needs metadata: no media session, no body, no slot
+        if request.method == "HEAD":
+            return await head_response(request, id, secure_hash)
+        
         return await media_streamer(request, id, secure_hash)
 
     except InvalidHash as e:
@@ -130,135 +244,314 @@ async def generic_stream_handler(request: web.Request):
         raise web.HTTPInternalServerError(text="Server error")
 
 
-# Cache for ByteStreamer instances per client
-class_cache = {}
-_cache_lock = asyncio.Lock()
+def _parse_path(request: web.Request, path: str) -> Tuple[int, Optional[str]]:
+    """(message id, secure hash) from /<hash><id> or /<id>/<name>?hash=<hash>"""
+    match = re.search(r"^([a-zA-Z0-9_-]{6})(\d+)$", path)
+    if match:
+        return int(match.group(2)), match.group(1)
+    match = re.search(r"(\d+)(?:\/\S+)?", path)
+    if not match:
+        raise web.HTTPBadRequest(text="Invalid URL format")
+    return int(match.group(1)), request.rel_url.query.get("hash")
 
 
-async def get_streamer(client) -> ByteStreamer:
-    """Get or create ByteStreamer for a client (thread-safe)"""
-    async with _cache_lock:
-        if client not in class_cache:
-            class_cache[client] = ByteStreamer(client)
-        return class_cache[client]
+def _traffic_class(request: web.Request) -> str:
+    """
+    'watch' for requests from a <video> or <audio> element, 'dl' for the rest.
 
+    The browser sets Sec-Fetch-Dest itself. The path and Referer are no
+    signal: the watch page's Download button fetches the same URL, and a
+    download manager can rewrite either.
+    """
+    if request.headers.get("Sec-Fetch-Dest") in ("video", "audio"):
+        return "watch"
+    return "dl"
 
-async def media_streamer(request: web.Request, id: int, secure_hash: str):
-    global active_connections
-    
-    active_connections += 1
-    
-    try:
-        range_header = request.headers.get("Range", 0)
-        
-        # Select least loaded client
-        if not work_loads:
-            work_loads[0] = 0
-        
-        index = min(work_loads, key=work_loads.get)
-        faster_client = multi_clients.get(index)
-        
-        if not faster_client:
-            faster_client = multi_clients.get(0)
-            index = 0
-        
-        if Var.MULTI_CLIENT:
-            logger.debug(f"Client {index} serving {request.remote}")
 
-        # Get ByteStreamer instance
-        tg_connect = await get_streamer(faster_client)
-        
-        # Get file properties with timeout
-        try:
-            file_id = await asyncio.wait_for(
-                tg_connect.get_file_properties(id),
-                timeout=30
-            )
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout getting file properties for {id}")
-            raise FIleNotFound
-        
-        # Verify hash
-        if file_id.unique_id[:6] != secure_hash:
-            raise InvalidHash
-        
-        file_size = file_id.file_size
+def _byte_ranges(
+    request: web.Request, file_size: int, honor_range: bool = True
+) -> Optional[List[Tuple[int, int]]]:
+    """Ranges to send with a 206, [] for the whole file, or None if not satisfiable"""
+    if not honor_range:
+        return []
+    ranges = parse_range(request.headers.get("Range", ""), file_size)
+    if ranges is None:
+        return []
+    return ranges or None
 
-        # Parse range header
-        if range_header:
-            from_bytes, until_bytes = range_header.replace("bytes=", "").split("-")
-            from_bytes = int(from_bytes)
-            until_bytes = int(until_bytes) if until_bytes else file_size - 1
-        else:
-            from_bytes = request.http_range.start or 0
-            until_bytes = (request.http_range.stop or file_size) - 1
-
-        # Validate range
-        if (until_bytes > file_size) or (from_bytes < 0) or (until_bytes < from_bytes):
-            return web.Response(
-                status=416,
-                body="416: Range not satisfiable",
-                headers={"Content-Range": f"bytes */{file_size}"},
-            )
-
-        chunk_size = 1024 * 1024  # 1MB chunks
-        until_bytes = min(until_bytes, file_size - 1)
-
-        offset = from_bytes - (from_bytes % chunk_size)
-        first_part_cut = from_bytes - offset
-        last_part_cut = until_bytes % chunk_size + 1
-
-        req_length = until_bytes - from_bytes + 1
-        part_count = math.ceil(until_bytes / chunk_size) - math.floor(offset / chunk_size)
-        
-        # Create safe body generator
-        async def safe_body():
+
+def _boundary(ranges: List[Tuple[int, int]]) -> Optional[str]:
+    return secrets.token_hex(16) if len(ranges) > 1 else None
+
+
+def _range_not_satisfiable(file_size: int) -> web.Response:
+    return web.Response(
+        status=416,
+        body="416: Range not satisfiable",
+        headers={"Content-Range": f"bytes */{file_size}"},
+    )
+
+
+def _file_validators(file_id) -> Tuple[str, int]:
+    """Strong ETag and Last-Modified timestamp of a file"""
+    return f'"{file_id.unique_id}-{file_id.file_size}"', getattr(file_id, "date", 0)
+
+
+def _token_validators(token: LinkToken) -> Tuple[str, int]:
+    # Tokens carry no unique_id, but a BIN_CHANNEL message never changes its file
+    return f'"v2-{token.id}-{token.size}"', 0
+
+
+def _etag_in(header: str, etag: str, weak: bool) -> bool:
+    """Whether an If-None-Match / If-Range style list contains our ETag"""
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def _not_modified(request: web.Request, etag: str, mtime: int) -> Optional[web.Response]:
+    """304 if the client's cached copy is still current (RFC 7232)"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        if not _etag_in(if_none_match, etag, weak=True):
+            return None
+    else:
+        since = request.if_modified_since
+        if since is None or not mtime or mtime > since.timestamp():
+            return None
+    return web.Response(status=304, headers=_validator_headers(etag, mtime))
+
+
+def _is_partial(request: web.Request, etag: str, mtime: int) -> bool:
+    """Whether to honor Range; a stale If-Range means send the whole file"""
+    if not request.headers.get("Range"):
+        return False
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', "W/")):
+        return _etag_in(if_range, etag, weak=False)
+    since = request.if_range
+    return bool(mtime) and since is not None and int(since.timestamp()) == mtime
+
+
+def _validator_headers(etag: str, mtime: int) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+    if mtime:
+        headers["Last-Modified"] = formatdate(mtime, usegmt=True)
+    return headers
+
+
+def _clean_name(name: str) -> str:
+    """File name from the URL, safe to put in a header"""
+    return re.sub(r'[\x00-\x1f"\\]', "", name or "")[:255]
+
+
+def _name_and_mime(mime_type: str, file_name: str) -> Tuple[str, str]:
+    """Fill in whichever of mime type and file name is missing"""
+    if mime_type:
+        if not file_name:
             try:
-                async for chunk in tg_connect.yield_file(
-                    file_id, index, offset, first_part_cut, 
-                    last_part_cut, part_count, chunk_size
-                ):
-                    if chunk:
-                        yield chunk
-            except (ConnectionError, BrokenPipeError, ConnectionResetError, OSError):
-                # Client disconnected
-                pass
-            except asyncio.CancelledError:
-                # Request cancelled
-                pass
-            except Exception as e:
-                logger.debug(f"Stream body error: {e}")
-
-        # Determine mime type and filename
-        mime_type = file_id.mime_type
-        file_name = file_id.file_name
-        disposition = "attachment"
-
-        if mime_type:
-            if not file_name:
-                try:
-                    file_name = f"{secrets.token_hex(2)}.{mime_type.split('/')[1]}"
-                except (IndexError, AttributeError):
-                    file_name = f"{secrets.token_hex(2)}.unknown"
-        else:
-            if file_name:
-                mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
-            else:
-                mime_type = "application/octet-stream"
+                file_name = f"{secrets.token_hex(2)}.{mime_type.split('/')[1]}"
+            except (IndexError, AttributeError):
                 file_name = f"{secrets.token_hex(2)}.unknown"
+    else:
+        if file_name:
+            mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        else:
+            mime_type = "application/octet-stream"
+            file_name = f"{secrets.token_hex(2)}.unknown"
+    return mime_type, file_name
+
+
+def _stream_headers(
+    mime_type: str,
+    file_name: str,
+    ranges: List[Tuple[int, int]],
+    file_size: int,
+    etag: str,
+    mtime: int,
+    boundary: Optional[str] = None,
+) -> dict:
+    headers = {
+        "Content-Type": f"{mime_type}",
+        "Content-Length": str(file_size),
+        "Content-Disposition": f'attachment; filename="{file_name}"',
+        "Accept-Ranges": "bytes",
+        **_validator_headers(etag, mtime),
+    }
+    if boundary:
+        headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+        headers["Content-Length"] = str(
+            multipart_length(boundary, mime_type, ranges, file_size)
+        )
+    elif ranges:
+        from_bytes, until_bytes = ranges[0]
+        headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+        headers["Content-Length"] = str(until_bytes - from_bytes + 1)
+    return headers
 
+
+async def head_response(request: web.Request, id: int, secure_hash: str) -> web.Response:
+    """Answer HEAD from metadata alone"""
+    file_id = await get_verified_file(id, secure_hash)
+    
+    etag, mtime = _file_validators(file_id)
+    not_modified = _not_modified(request, etag, mtime)
+    if not_modified is not None:
+        return not_modified
+    
+    ranges = _byte_ranges(request, file_id.file_size, _is_partial(request, etag, mtime))
+    if ranges is None:
+        return _range_not_satisfiable(file_id.file_size)
+    
+    mime_type, file_name = _name_and_mime(file_id.mime_type, file_id.file_name)
+    return web.Response(
+        status=206 if ranges else 200,
+        headers=_stream_headers(
+            mime_type, file_name, ranges, file_id.file_size, etag, mtime, _boundary(ranges)
+        ),
+    )
+
+
+async def media_streamer(
+    request: web.Request,
+    id: int,
+    secure_hash: Optional[str],
+    token: Optional[LinkToken] = None,
+):
+    file_id = await get_verified_file(id, secure_hash, token)
+    file_size = file_id.file_size
+
+    # Revalidation never needs a byte from Telegram
+    etag, mtime = _token_validators(token) if token else _file_validators(file_id)
+    not_modified = _not_modified(request, etag, mtime)
+    if not_modified is not None:
+        return not_modified
+
+    # Parse and validate range header
+    ranges = _byte_ranges(request, file_size, _is_partial(request, etag, mtime))
+    if ranges is None:
+        return _range_not_satisfiable(file_size)
+    boundary = _boundary(ranges)
+
+    # Accelerators get their share of connections here, before they can queue
+    ip = client_ip(request)
+    shaped = shaper.open(_traffic_class(request), ip, getattr(file_id, "unique_id", "") or id)
+    if shaped is None:
         return web.Response(
-            status=206 if range_header else 200,
-            body=safe_body(),
-            headers={
-                "Content-Type": f"{mime_type}",
-                "Content-Range": f"bytes {from_bytes}-{until_bytes}/{file_size}",
-                "Content-Length": str(req_length),
-                "Content-Disposition": f'{disposition}; filename="{file_name}"',
-                "Accept-Ranges": "bytes",
-                "Cache-Control": "public, max-age=3600",
-            },
+            status=429,
+            text="Too many connections, please try again later",
+            headers={"Retry-After": "5"}
         )
-        
+
+    # Count the stream from here until its body is sent, queueing if busy
+    try:
+        ticket = await admission.acquire(ip)
+    except BaseException:
+        shaped.close()
+        raise
+    if ticket is None:
+        shaped.close()
+        return web.Response(
+            status=503,
+            text="Server busy, please try again later",
+            headers={"Retry-After": "30"}
+        )
+    try:
+        return await _stream_response(
+            request, file_id, ranges, boundary, etag, mtime, ticket, shaped
+        )
+    except BaseException:
+        ticket.release()
+        shaped.close()
+        raise
+
+
+async def _stream_response(
+    request: web.Request,
+    file_id: FileId,
+    ranges: List[Tuple[int, int]],
+    boundary: Optional[str],
+    etag: str,
+    mtime: int,
+    ticket: StreamTicket,
+    shaped: ShapedStream,
+) -> web.StreamResponse:
+    file_size = file_id.file_size
+    chunk_size = 1024 * 1024  # 1MB chunks
+
+    # Overlapping ranges are already merged, so this is one forward pass
+    send = ranges or ([(0, file_size - 1)] if file_size else [])
+    # Container headers and indexes already in memory aren't fetched again
+    segments = container_index.split(getattr(file_id, "unique_id", ""), send)
+    upstream = [(first, last) for first, last, data in segments if data is None]
+    parts = plan_parts(upstream, chunk_size, Var.MIN_FETCH_SIZE)
+    req_length = sum(last - first + 1 for first, last in upstream)
+
+    # Serve from the bot expected to finish this transfer first
+    index, faster_client = balancer.pick(file_id.dc_id, req_length)
+    if not faster_client:
+        faster_client = multi_clients.get(0)
+        index = 0
+    tg_connect = await get_streamer(faster_client)
+    container_index.schedule(file_id, tg_connect)
+    
+    if Var.MULTI_CLIENT:
+        logger.debug(f"Client {index} serving {request.remote}")
+
+    # Stripe large responses over the other bots in the pool
+    helpers = None
+    if Var.STRIPED_DOWNLOAD and len(multi_clients) > 1 and req_length >= Var.STRIPE_MIN_SIZE:
+        helpers = [
+            await get_streamer(client)
+            for client in multi_clients.values()
+            if client is not faster_client
+        ]
+    
+    # Determine mime type and filename
+    mime_type, file_name = _name_and_mime(file_id.mime_type, file_id.file_name)
+
+    # Write with backpressure: each chunk is fetched only once the last has drained
+    chunks = tg_connect.yield_parts(file_id, index, parts, helpers)
+    if len(upstream) < len(segments):
+        chunks = splice_body(segments, chunks)
+    if boundary:
+        chunks = multipart_body(chunks, boundary, mime_type, ranges, file_size)
+    headers = _stream_headers(mime_type, file_name, ranges, file_size, etag, mtime, boundary)
+    response = web.StreamResponse(status=206 if ranges else 200, headers=headers)
+    expected = int(headers["Content-Length"])
+    sent = 0
+    try:
+        await response.prepare(request)
+        async for chunk in chunks:
+            if chunk:
+                await shaped.throttle(len(chunk))
+                await response.write(chunk)
+                sent += len(chunk)
+        if sent < expected:
+            response.force_close()
+        await response.write_eof()
+    except (ConnectionError, BrokenPipeError, ConnectionResetError, OSError):
+        # Client disconnected
+        pass
+    except Exception as e:
+        logger.debug(f"Stream body error: {e}")
     finally:
-        active_connections -= 1
+        if sent < expected:
+            # Don't let a short body pass for a whole one on a kept-alive
+            # connection, however the loop ended; aiohttp finishes it after us
+            response.force_close()
+        await chunks.aclose()
+        ticket.release()
+        shaped.close()
+    return response
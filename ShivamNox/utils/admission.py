@@ -0,0 +1,142 @@
+# (c) ShivamNox - Stream admission control
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+from aiohttp import web
+from ShivamNox.vars import Var
+
+
+def client_ip(request: web.Request) -> str:
+    """Address of the viewer, looking through the platform's proxy when trusted"""
+    if Var.TRUST_PROXY:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            # The last hop is the one the proxy itself added
+            return forwarded.split(",")[-1].strip()
+    return request.remote or "unknown"
+
+
+class StreamTicket:
+    """One admitted stream; frees its slot exactly once"""
+    __slots__ = ("_admission", "released")
+
+    def __init__(self, admission: "AdmissionControl"):
+        self._admission = admission
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._admission._release()
+
+
+class AdmissionControl:
+    """
+    Limits how many streams run at once, counting each from admission until
+    its body has been sent.
+
+    Requests over the limit wait in a bounded queue instead of getting an
+    instant 503. Waiters are kept per client IP and a freed slot goes to the
+    IPs in turn, so one download manager can't push everyone else back.
+    """
+    def __init__(self, limit: int, queue_size: int, timeout: float, per_ip: Optional[int] = None):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.per_ip = per_ip or max(1, queue_size // 4)
+        self.active = 0
+        self.queued = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self.admitted = 0
+        self.waited = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def acquire(self, ip: str) -> Optional[StreamTicket]:
+        """A ticket once a slot is free, or None if the queue is full or timed out"""
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return StreamTicket(self)
+
+        waiters = self._waiters.get(ip)
+        if self.queued >= self.queue_size or (waiters and len(waiters) >= self.per_ip):
+            self.rejected += 1
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        if waiters is None:
+            waiters = self._waiters[ip] = deque()
+        waiters.append(future)
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client left while queued; pass on a slot it was just given
+            if future.done():
+                self._release()
+            else:
+                future.cancel()
+                self._forget(ip, future)
+            raise
+        if not future.done():
+            future.cancel()
+            self._forget(ip, future)
+            self.timeouts += 1
+            return None
+        # The slot was handed over by _release, already counted in active
+        self._waits.append(time.monotonic() - started)
+        self.admitted += 1
+        self.waited += 1
+        return StreamTicket(self)
+
+    def _forget(self, ip: str, future: asyncio.Future):
+        waiters = self._waiters.get(ip)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+            self.queued -= 1
+        except ValueError:
+            return
+        if not waiters:
+            del self._waiters[ip]
+
+    def _release(self):
+        # Hand the slot straight to the next IP in turn
+        while self._waiters:
+            ip, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiters.move_to_end(ip)
+            else:
+                del self._waiters[ip]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active = max(0, self.active - 1)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "queued": self.queued,
+            "queued_ips": len(self._waiters),
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_ms_p50": round(waits[len(waits) // 2] * 1000) if waits else 0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000) if waits else 0,
+            "wait_ms_max": round(waits[-1] * 1000) if waits else 0,
+        }
+
+
+admission = AdmissionControl(Var.MAX_CONNECTIONS, Var.QUEUE_SIZE, Var.QUEUE_TIMEOUT)
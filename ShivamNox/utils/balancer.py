@@ -0,0 +1,92 @@
+# (c) ShivamNox - Client load balancing
+import random
+from typing import Dict, Optional, Tuple
+from pyrogram import Client
+from ShivamNox.vars import Var
+from ShivamNox.bot import multi_clients, work_loads
+from .cooldown import cooldowns
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ClientBalancer:
+    """
+    Picks the bot expected to finish a new transfer first.
+
+    Each bot is scored by the bytes it still has to send plus the new
+    transfer, times its recent GetFile latency (an EWMA per DC). Two bots
+    are sampled at random and the better one wins, so picking stays cheap
+    however large the pool grows. Bots whose home DC holds the file are
+    preferred while they have room, which saves a foreign-DC media session.
+    """
+    def __init__(self, alpha: float = 0.2, default_latency: float = 0.5):
+        self.alpha = alpha
+        self.default_latency = default_latency  # seconds per MB before we know better
+        self.bytes_in_flight: Dict[Client, int] = {}
+        self.latency: Dict[Tuple[Client, int], float] = {}  # seconds per MB
+        self.home_dc: Dict[Client, int] = {}
+
+    async def register(self, client: Client):
+        """Remember which DC a client's account lives on"""
+        try:
+            self.home_dc[client] = await client.storage.dc_id()
+        except Exception:
+            pass
+
+    def add(self, client: Client, nbytes: int):
+        """Adjust a client's outstanding bytes (negative when sent)"""
+        self.bytes_in_flight[client] = max(0, self.bytes_in_flight.get(client, 0) + nbytes)
+
+    def observe(self, client: Client, dc_id: int, seconds: float, nbytes: int):
+        """Record how long one GetFile of ``nbytes`` took"""
+        sample = seconds * CHUNK_SIZE / max(nbytes, 1)
+        key = (client, dc_id)
+        old = self.latency.get(key)
+        self.latency[key] = sample if old is None else old + self.alpha * (sample - old)
+
+    def _latency(self, client: Client, dc_id: Optional[int]) -> float:
+        if dc_id is not None and (client, dc_id) in self.latency:
+            return self.latency[(client, dc_id)]
+        known = [v for (c, _), v in self.latency.items() if c is client]
+        if not known:
+            # A bot we haven't measured yet is assumed to be about average
+            known = list(self.latency.values())
+        return sum(known) / len(known) if known else self.default_latency
+
+    def expected(self, client: Client, dc_id: Optional[int] = None, size: int = 0) -> float:
+        """Seconds until this client would have sent ``size`` more bytes"""
+        pending = self.bytes_in_flight.get(client, 0) + size
+        return pending / CHUNK_SIZE * self._latency(client, dc_id)
+
+    def pick(self, dc_id: Optional[int] = None, size: int = 0) -> Tuple[int, Optional[Client]]:
+        """Return (index, client) of the bot to serve a transfer"""
+        clients = list(multi_clients.items())
+        if not clients:
+            return 0, None
+        ready = [c for c in clients if not cooldowns.is_cooling(c[1])] or clients
+        if dc_id is not None:
+            local = [
+                c for c in ready
+                if self.home_dc.get(c[1]) == dc_id
+                and work_loads.get(c[0], 0) < Var.AFFINITY_MAX_STREAMS
+            ]
+            ready = local or ready
+        sample = ready if len(ready) <= 2 else random.sample(ready, 2)
+        return min(sample, key=lambda c: self.expected(c[1], dc_id, size))
+
+    def scores(self) -> dict:
+        result = {}
+        for index, client in sorted(multi_clients.items()):
+            result["bot" + str(index + 1)] = {
+                "home_dc": self.home_dc.get(client),
+                "bytes_in_flight": self.bytes_in_flight.get(client, 0),
+                "latency_ms": {
+                    f"dc{dc}": round(v * 1000) for (c, dc), v in self.latency.items()
+                    if c is client
+                },
+                "expected_s": round(self.expected(client), 2),
+            }
+        return result
+
+
+balancer = ClientBalancer()
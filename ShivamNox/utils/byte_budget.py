@@ -0,0 +1,80 @@
+# (c) ShivamNox - Process-wide stream buffer budget
+import time
+import asyncio
+from collections import deque
+from typing import Deque, Tuple
+
+
+class ByteBudget:
+    """
+    Caps the bytes fetched from Telegram but not yet written to a client.
+
+    Streams reserve a part before fetching it and give it back once the
+    client has taken it, so read-ahead slows down for everyone when RAM
+    runs short. Waiters are served in order; a reservation is always
+    granted when nothing is held, so a part bigger than the budget can't
+    stall. ``max_bytes`` 0 disables the cap.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.peak = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self.waits = 0
+        self.wait_total = 0.0
+
+    def _fits(self, nbytes: int) -> bool:
+        return not self.max_bytes or not self.used or self.used + nbytes <= self.max_bytes
+
+    def _take(self, nbytes: int):
+        self.used += nbytes
+        self.peak = max(self.peak, self.used)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        if self._waiters or not self._fits(nbytes):
+            return False
+        self._take(nbytes)
+        return True
+
+    async def acquire(self, nbytes: int):
+        if self.try_acquire(nbytes):
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((nbytes, future))
+        self.waits += 1
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(nbytes)
+            else:
+                try:
+                    self._waiters.remove((nbytes, future))
+                except ValueError:
+                    pass
+                self._wake()
+            raise
+        finally:
+            self.wait_total += time.monotonic() - started
+
+    def release(self, nbytes: int):
+        self.used = max(0, self.used - nbytes)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._fits(self._waiters[0][0]):
+            nbytes, future = self._waiters.popleft()
+            if not future.done():
+                self._take(nbytes)
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "used": self.used,
+            "max_bytes": self.max_bytes,
+            "peak": self.peak,
+            "waiting": len(self._waiters),
+            "waits": self.waits,
+            "avg_wait_ms": round(self.wait_total / self.waits * 1000, 2) if self.waits else 0,
+        }
@@ -0,0 +1,163 @@
+# (c) ShivamNox - HTTP byte ranges (RFC 7233)
+import re
+from typing import AsyncIterator, List, Optional, Tuple
+
+MAX_RANGES = 16  # a Range header asking for more is ignored
+COALESCE_GAP = 80  # about the framing cost of one more multipart part
+
+_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$", re.ASCII)
+
+
+def parse_range(header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Ranges (first, last) to send, sorted and coalesced.
+
+    Returns None when the header should be ignored (not bytes, malformed or
+    too many ranges) and an empty list when no range is satisfiable.
+    """
+    unit, sep, specs = (header or "").partition("=")
+    if not sep or unit.strip().lower() != "bytes":
+        return None
+    specs = [spec for spec in specs.split(",") if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = _SPEC.match(spec)
+        if not match:
+            return None
+        first, last = match.groups()
+        if not first:
+            # Suffix range: the final N bytes
+            if not last:
+                return None
+            length = int(last)
+            if length and file_size:
+                ranges.append((max(0, file_size - length), file_size - 1))
+            continue
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        if first < file_size:
+            last = int(last) if last else file_size - 1
+            ranges.append((first, min(last, file_size - 1)))
+
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for first, last in ranges:
+        if merged and first <= merged[-1][1] + 1 + COALESCE_GAP:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def smallest_part(first: int, last: int, chunk_size: int, min_limit: int) -> Tuple[int, int]:
+    """
+    Smallest (offset, limit) GetFile part covering ``first``..``last``.
+
+    The limit is a power of two from ``min_limit`` up to ``chunk_size`` and
+    the offset a multiple of it, so the part never crosses a chunk boundary
+    as upload.GetFile requires. ``first`` and ``last`` must share a chunk.
+    """
+    limit = min_limit
+    while limit < chunk_size and first - first % limit + limit <= last:
+        limit *= 2
+    limit = min(limit, chunk_size)
+    return first - first % limit, limit
+
+
+def plan_parts(
+    ranges: List[Tuple[int, int]], chunk_size: int, min_limit: int = 0
+) -> List[Tuple[int, int, int, int]]:
+    """
+    (offset, limit, start, end) parts that cover ``ranges`` in order.
+
+    Whole chunks are fetched with ``chunk_size``. With ``min_limit`` set,
+    the partial chunks at either end of a range are fetched with the
+    smallest aligned limit instead, so small probes cost kilobytes.
+    """
+    parts = []
+    for first, last in ranges:
+        offset = first - first % chunk_size
+        while offset <= last:
+            start = max(first - offset, 0)
+            end = min(last - offset + 1, chunk_size)
+            if min_limit and end - start < chunk_size:
+                part_offset, limit = smallest_part(
+                    offset + start, offset + end - 1, chunk_size, min_limit
+                )
+                shift = part_offset - offset
+                parts.append((part_offset, limit, start - shift, end - shift))
+            else:
+                parts.append((offset, chunk_size, start, end))
+            offset += chunk_size
+    return parts
+
+
+def part_header(boundary: str, mime_type: str, first: int, last: int, file_size: int) -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f"Content-Type: {mime_type}\r\n"
+        f"Content-Range: bytes {first}-{last}/{file_size}\r\n\r\n"
+    ).encode()
+
+
+def closing_boundary(boundary: str) -> bytes:
+    return f"--{boundary}--\r\n".encode()
+
+
+def multipart_length(
+    boundary: str, mime_type: str, ranges: List[Tuple[int, int]], file_size: int
+) -> int:
+    """Exact size of a multipart/byteranges body"""
+    length = len(closing_boundary(boundary))
+    for first, last in ranges:
+        length += len(part_header(boundary, mime_type, first, last, file_size))
+        length += last - first + 1 + 2  # data and its trailing CRLF
+    return length
+
+
+async def multipart_body(
+    chunks: AsyncIterator[bytes],
+    boundary: str,
+    mime_type: str,
+    ranges: List[Tuple[int, int]],
+    file_size: int,
+) -> AsyncIterator[bytes]:
+    """Frame the chunks of ``ranges``, in order, as multipart/byteranges"""
+    pending = iter(ranges)
+    remaining = 0
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if not remaining:
+            first, last = next(pending)
+            remaining = last - first + 1
+            yield part_header(boundary, mime_type, first, last, file_size)
+        yield chunk
+        remaining -= len(chunk)
+        if not remaining:
+            yield b"\r\n"
+    if not remaining and next(pending, None) is None:
+        yield closing_boundary(boundary)
+
+
+async def splice_body(
+    segments: List[Tuple[int, int, Optional[bytes]]],
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[bytes]:
+    """Yield each (first, last, data) segment, taking missing data from ``chunks``"""
+    for first, last, data in segments:
+        if data is not None:
+            yield data
+            continue
+        remaining = last - first + 1
+        while remaining > 0:
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                return
+            yield chunk
+            remaining -= len(chunk)
@@ -0,0 +1,134 @@
+# (c) ShivamNox - In-memory cache
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Hashable, Optional
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires")
+
+    def __init__(self, value: Any, size: int, expires: float):
+        self.value = value
+        self.size = size
+        self.expires = expires
+
+
+class TTLCache:
+    """
+    LRU cache bounded by an estimated byte budget, with one fixed TTL.
+
+    Meant for a single event loop, so nothing is locked. Because every entry
+    lives for the same TTL, insertion order is expiry order: expired entries
+    are dropped from the front of a queue on each write, in O(1) amortised.
+    Overwrites and evictions leave stale queue items behind; the queue is
+    compacted whenever they outnumber the live entries.
+    """
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof or sys.getsizeof
+        self._data: OrderedDict = OrderedDict()
+        self._expiry: deque = deque()  # (expires, key) in insertion order
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry.expires > time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry.expires <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like get, but leaves the stats and the LRU order alone"""
+        entry = self._data.get(key)
+        if entry is None or entry.expires <= time.monotonic():
+            return default
+        return entry.value
+
+    def set(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        self._expire(now)
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        entry = _Entry(value, size, now + self.ttl)
+        self._data[key] = entry
+        self._expiry.append((entry.expires, key))
+        self.size += size
+        while self.size > self.max_bytes:
+            _, old = self._data.popitem(last=False)
+            self.size -= old.size
+            self.evictions += 1
+        if len(self._expiry) > 2 * len(self._data) + 64:
+            self._compact()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._drop(key)
+        return default if entry is None else entry.value
+
+    def clear(self):
+        self._data.clear()
+        self._expiry.clear()
+        self.size = 0
+
+    def _drop(self, key: Hashable) -> Optional[_Entry]:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+        return entry
+
+    def _expire(self, now: float):
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            expires, key = expiry.popleft()
+            entry = self._data.get(key)
+            # Skip keys that were rewritten or evicted since
+            if entry is not None and entry.expires == expires:
+                self._drop(key)
+                self.expirations += 1
+
+    def _compact(self):
+        # Keep only the queue items that still match a live entry
+        data = self._data
+        self._expiry = deque(
+            (expires, key) for expires, key in self._expiry
+            if key in data and data[key].expires == expires
+        )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,480 @@
+# (c) ShivamNox - MP4/MKV header and seek index cache
+import array
+import struct
+import asyncio
+import logging
+import sys
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+from pyrogram.file_id import FileId
+from ShivamNox.vars import Var
+from .cache import TTLCache
+from .byte_range import plan_parts
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+HEAD_SIZE = 64 * 1024  # first read of every file; holds ftyp or the EBML header
+MAX_TOP_LEVEL_BOXES = 64
+
+_MP4_TYPES = ("video/mp4", "video/quicktime", "video/x-m4v", "audio/mp4", "audio/x-m4a")
+_MKV_TYPES = ("video/x-matroska", "video/webm", "audio/webm", "audio/x-matroska")
+_EXTENSIONS = (".mp4", ".m4v", ".mov", ".m4a", ".mkv", ".webm", ".mka")
+
+# Matroska element ids, marker bits included
+_EBML = 0x1A45DFA3
+_SEGMENT = 0x18538067
+_SEEK_HEAD = 0x114D9B74
+_SEEK = 0x4DBB
+_SEEK_ID = 0x53AB
+_SEEK_POSITION = 0x53AC
+_INFO = 0x1549A966
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_CLUSTER = 0x1F43B675
+_CUES = 0x1C53BB6B
+_CUE_POINT = 0xBB
+_CUE_TIME = 0xB3
+_CUE_TRACK_POSITIONS = 0xB7
+_CUE_CLUSTER_POSITION = 0xF1
+
+
+class IndexFetchError(ConnectionError):
+    """A part of the file couldn't be fetched; says nothing about the file"""
+
+
+class ContainerIndex:
+    """Header/index bytes of one file plus its keyframe time -> offset table"""
+    __slots__ = ("container", "duration", "regions", "times", "offsets")
+
+    def __init__(
+        self,
+        container: str,
+        duration: float = 0,
+        regions: Optional[List[Tuple[int, bytes]]] = None,
+        times: Optional[List[float]] = None,
+        offsets: Optional[List[int]] = None,
+    ):
+        self.container = container
+        self.duration = duration
+        self.regions = _merge_regions(regions or [])
+        self.times = times or []
+        self.offsets = offsets or []
+
+    def offset_for(self, seconds: float) -> Optional[int]:
+        """Byte offset of the last keyframe at or before ``seconds``"""
+        if not self.times:
+            return None
+        return self.offsets[max(bisect_right(self.times, seconds) - 1, 0)]
+
+    def nbytes(self) -> int:
+        return sum(len(data) for _, data in self.regions) + 16 * len(self.times) + 256
+
+    def summary(self) -> dict:
+        return {
+            "container": self.container,
+            "duration": round(self.duration, 3),
+            "regions": [[offset, offset + len(data) - 1] for offset, data in self.regions],
+            "keyframes": len(self.times),
+        }
+
+
+def _merge_regions(regions: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes]]:
+    merged: List[Tuple[int, bytes]] = []
+    for offset, data in sorted(regions, key=lambda r: r[0]):
+        if not data:
+            continue
+        if merged and offset <= merged[-1][0] + len(merged[-1][1]):
+            last_offset, last_data = merged[-1]
+            tail = data[last_offset + len(last_data) - offset:]
+            merged[-1] = (last_offset, last_data + tail)
+        else:
+            merged.append((offset, data))
+    return merged
+
+
+# ---------------------------------------------------------------- MP4
+
+def _boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, body_start, box_end) of the boxes in data[start:end]"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _box(data: bytes, start: int, end: int, *path: bytes) -> Optional[Tuple[int, int]]:
+    for kind, body, box_end in _boxes(data, start, end):
+        if kind == path[0]:
+            return (body, box_end) if len(path) == 1 else _box(data, body, box_end, *path[1:])
+    return None
+
+
+def _table(data: bytes, start: int, count: int, typecode: str) -> array.array:
+    table = array.array(typecode)
+    table.frombytes(data[start:start + count * table.itemsize])
+    if sys.byteorder == "little":
+        table.byteswap()
+    return table
+
+
+def _parse_moov(moov: bytes) -> Tuple[float, List[float], List[int]]:
+    """Duration and keyframe (seconds, byte offset) table of the video track"""
+    tracks = [(body, end) for kind, body, end in _boxes(moov, 0, len(moov)) if kind == b"trak"]
+    chosen = None
+    for body, end in tracks:
+        hdlr = _box(moov, body, end, b"mdia", b"hdlr")
+        if hdlr and moov[hdlr[0] + 8:hdlr[0] + 12] == b"vide":
+            chosen = (body, end)
+            break
+    chosen = chosen or (tracks[0] if tracks else None)
+    if chosen is None:
+        return 0, [], []
+
+    mdhd = _box(moov, *chosen, b"mdia", b"mdhd")
+    stbl = _box(moov, *chosen, b"mdia", b"minf", b"stbl")
+    if not mdhd or not stbl:
+        return 0, [], []
+    if moov[mdhd[0]] == 1:
+        timescale, duration = struct.unpack_from(">IQ", moov, mdhd[0] + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", moov, mdhd[0] + 12)
+    if not timescale:
+        return 0, [], []
+
+    boxes = {kind: (body, end) for kind, body, end in _boxes(moov, *stbl)}
+    if not all(k in boxes for k in (b"stts", b"stsc", b"stsz")):
+        return duration / timescale, [], []
+    if b"stco" in boxes:
+        body = boxes[b"stco"][0]
+        chunk_offsets = _table(moov, body + 8, struct.unpack_from(">I", moov, body + 4)[0], "I")
+    elif b"co64" in boxes:
+        body = boxes[b"co64"][0]
+        chunk_offsets = _table(moov, body + 8, struct.unpack_from(">I", moov, body + 4)[0], "Q")
+    else:
+        return duration / timescale, [], []
+
+    body = boxes[b"stts"][0]
+    stts = _table(moov, body + 8, 2 * struct.unpack_from(">I", moov, body + 4)[0], "I")
+    body = boxes[b"stsc"][0]
+    stsc = _table(moov, body + 8, 3 * struct.unpack_from(">I", moov, body + 4)[0], "I")
+    body = boxes[b"stsz"][0]
+    sample_size, sample_count = struct.unpack_from(">II", moov, body + 4)
+    sizes = None if sample_size else _table(moov, body + 12, sample_count, "I")
+    sync = None
+    if b"stss" in boxes:
+        body = boxes[b"stss"][0]
+        sync = _table(moov, body + 8, struct.unpack_from(">I", moov, body + 4)[0], "I")
+
+    times: List[float] = []
+    offsets: List[int] = []
+    sample = 1
+    tick = 0
+    stts_i, stts_left = 0, stts[0] if stts else 0
+    sync_i = 0
+    for i in range(0, len(stsc), 3):
+        first_chunk, per_chunk = stsc[i], stsc[i + 1]
+        next_chunk = stsc[i + 3] if i + 3 < len(stsc) else len(chunk_offsets) + 1
+        for chunk in range(first_chunk, next_chunk):
+            if chunk > len(chunk_offsets):
+                break
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(per_chunk):
+                if sample > sample_count:
+                    break
+                seconds = tick / timescale
+                if sync is None:
+                    # Every sample is a keyframe: keep about one per second
+                    if not times or seconds - times[-1] >= 1:
+                        times.append(seconds)
+                        offsets.append(offset)
+                elif sync_i < len(sync) and sync[sync_i] == sample:
+                    times.append(seconds)
+                    offsets.append(offset)
+                    sync_i += 1
+                offset += sizes[sample - 1] if sizes is not None else sample_size
+                while stts_left == 0 and stts_i + 2 < len(stts):
+                    stts_i += 2
+                    stts_left = stts[stts_i]
+                if stts_left:
+                    tick += stts[stts_i + 1]
+                    stts_left -= 1
+                sample += 1
+    return duration / timescale, times, offsets
+
+
+# ---------------------------------------------------------------- Matroska
+
+def _vint(data: bytes, pos: int, keep_marker: bool) -> Tuple[int, int]:
+    first = data[pos]
+    length, mask = 1, 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("invalid EBML varint")
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[pos + 1:pos + length]:
+        value = value << 8 | byte
+    if pos + length > len(data):
+        raise IndexError
+    return value, length
+
+
+def _elements(data: bytes, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+    """(id, body_start, element_end) of the EBML elements in data[start:end]"""
+    pos = start
+    while pos < end:
+        try:
+            element, id_length = _vint(data, pos, True)
+            size, size_length = _vint(data, pos + id_length, False)
+        except (IndexError, ValueError):
+            return
+        body = pos + id_length + size_length
+        unknown = size == (1 << (7 * size_length)) - 1
+        yield element, body, end if unknown else body + size
+        if unknown:
+            return
+        pos = body + size
+
+
+def _uint(data: bytes, start: int, end: int) -> int:
+    return int.from_bytes(data[start:end], "big")
+
+
+def _parse_cues(data: bytes, start: int, end: int, base: int, scale: int) -> Tuple[List[float], List[int]]:
+    times: List[float] = []
+    offsets: List[int] = []
+    for element, body, element_end in _elements(data, start, end):
+        if element != _CUE_POINT:
+            continue
+        cue_time = position = None
+        for child, child_body, child_end in _elements(data, body, element_end):
+            if child == _CUE_TIME:
+                cue_time = _uint(data, child_body, child_end)
+            elif child == _CUE_TRACK_POSITIONS and position is None:
+                for leaf, leaf_body, leaf_end in _elements(data, child_body, child_end):
+                    if leaf == _CUE_CLUSTER_POSITION:
+                        position = _uint(data, leaf_body, leaf_end)
+        if cue_time is not None and position is not None:
+            times.append(cue_time * scale / 1e9)
+            offsets.append(base + position)
+    order = sorted(range(len(times)), key=times.__getitem__)
+    return [times[i] for i in order], [offsets[i] for i in order]
+
+
+class ContainerIndexer:
+    """
+    Finds the header and index of MP4 and MKV files the first time they are
+    streamed, and keeps their bytes and a keyframe table per ``unique_id``.
+
+    Later requests that land on those bytes (the moov box, the Cues, the
+    first kilobytes) are answered from memory instead of Telegram, and
+    ``offset_for`` turns a playback time into a byte offset.
+    """
+    def __init__(self, max_bytes: int, max_index_bytes: int, ttl: float = 6 * 3600):
+        self.max_index_bytes = max_index_bytes
+        self._cache = TTLCache(max_bytes=max_bytes, ttl=ttl, sizeof=ContainerIndex.nbytes)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.indexed = 0
+        self.failed = 0
+        self.bytes_served = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.max_bytes > 0
+
+    @staticmethod
+    def indexable(file_id: FileId) -> bool:
+        mime = (getattr(file_id, "mime_type", "") or "").lower()
+        name = (getattr(file_id, "file_name", "") or "").lower()
+        return mime in _MP4_TYPES or mime in _MKV_TYPES or name.endswith(_EXTENSIONS)
+
+    def get(self, unique_id: str) -> Optional[ContainerIndex]:
+        return self._cache.get(unique_id) if unique_id else None
+
+    def schedule(self, file_id: FileId, streamer) -> Optional[asyncio.Task]:
+        """Start indexing in the background unless it is known or under way"""
+        unique_id = getattr(file_id, "unique_id", "")
+        if not self.enabled or not unique_id or not self.indexable(file_id):
+            return None
+        if unique_id in self._cache:
+            return None
+        task = self._tasks.get(unique_id)
+        if task is None:
+            task = asyncio.ensure_future(self._index(file_id, streamer))
+            self._tasks[unique_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(unique_id, None))
+        return task
+
+    async def index(self, file_id: FileId, streamer) -> Optional[ContainerIndex]:
+        """The index of a file, building it now if needed"""
+        index = self.get(getattr(file_id, "unique_id", ""))
+        if index is not None:
+            return index
+        task = self.schedule(file_id, streamer)
+        return await asyncio.shield(task) if task else None
+
+    def split(
+        self, unique_id: str, ranges: List[Tuple[int, int]]
+    ) -> List[Tuple[int, int, Optional[memoryview]]]:
+        """
+        Cut ``ranges`` into (first, last, data) segments, where data holds
+        the bytes when they are cached here and is None otherwise.
+        """
+        index = self.get(unique_id)
+        regions = index.regions if index else []
+        segments = []
+        for first, last in ranges:
+            pos = first
+            for offset, data in regions:
+                end = offset + len(data) - 1
+                if end < pos or offset > last:
+                    continue
+                if offset > pos:
+                    segments.append((pos, offset - 1, None))
+                    pos = offset
+                stop = min(end, last)
+                segments.append((pos, stop, memoryview(data)[pos - offset:stop - offset + 1]))
+                self.bytes_served += stop - pos + 1
+                pos = stop + 1
+            if pos <= last:
+                segments.append((pos, last, None))
+        return segments
+
+    async def _read(self, file_id: FileId, streamer, first: int, last: int) -> bytes:
+        parts = plan_parts([(first, last)], CHUNK_SIZE, 4096)
+        chunks = await asyncio.gather(*(
+            streamer.fetch_part(file_id, offset, limit) for offset, limit, _, _ in parts
+        ))
+        if any(chunk is None for chunk in chunks):
+            raise IndexFetchError("part fetch failed")
+        return b"".join(chunk[start:end] for chunk, (_, _, start, end) in zip(chunks, parts))
+
+    async def _index(self, file_id: FileId, streamer) -> Optional[ContainerIndex]:
+        unique_id = file_id.unique_id
+        file_size = getattr(file_id, "file_size", 0) or 0
+        try:
+            head = await self._read(file_id, streamer, 0, min(HEAD_SIZE, file_size) - 1)
+            if head[4:8] == b"ftyp":
+                index = await self._index_mp4(file_id, streamer, head, file_size)
+            elif head[:4] == _EBML.to_bytes(4, "big"):
+                index = await self._index_mkv(file_id, streamer, head, file_size)
+            else:
+                index = ContainerIndex("unknown")
+        except asyncio.CancelledError:
+            raise
+        except IndexFetchError as e:
+            # Transient; leave it uncached so the next stream tries again
+            logger.debug(f"Indexing {unique_id} failed: {e}")
+            self.failed += 1
+            return None
+        except Exception as e:
+            logger.debug(f"Indexing {unique_id} failed: {e}")
+            self.failed += 1
+            index = ContainerIndex("unknown")
+        else:
+            if index.container != "unknown":
+                self.indexed += 1
+        self._cache.set(unique_id, index)
+        return index
+
+    async def _index_mp4(self, file_id: FileId, streamer, head: bytes, file_size: int) -> ContainerIndex:
+        regions = [(0, head)]
+        pos = 0
+        for _ in range(MAX_TOP_LEVEL_BOXES):
+            if pos + 8 > file_size:
+                break
+            header = head[pos:pos + 16] if pos + 16 <= len(head) else await self._read(
+                file_id, streamer, pos, min(pos + 15, file_size - 1)
+            )
+            size, kind = struct.unpack_from(">I4s", header)
+            if size == 1:
+                size = struct.unpack_from(">Q", header, 8)[0]
+            elif size == 0:
+                size = file_size - pos
+            if size < 8:
+                break
+            if kind == b"moov":
+                if size > self.max_index_bytes:
+                    break
+                moov = head[pos:pos + size] if pos + size <= len(head) else await self._read(
+                    file_id, streamer, pos, pos + size - 1
+                )
+                regions.append((pos, moov))
+                body = 16 if struct.unpack_from(">I", moov)[0] == 1 else 8
+                duration, times, offsets = await asyncio.to_thread(_parse_moov, moov[body:])
+                return ContainerIndex("mp4", duration, regions, times, offsets)
+            pos += size
+        return ContainerIndex("mp4", regions=regions)
+
+    async def _index_mkv(self, file_id: FileId, streamer, head: bytes, file_size: int) -> ContainerIndex:
+        segment = next((e for e in _elements(head, 0, len(head)) if e[0] == _SEGMENT), None)
+        if segment is None:
+            return ContainerIndex("mkv", regions=[(0, head)])
+        base = segment[1]
+        scale, duration = 1000000, 0.0
+        cues_at = None
+        header_end = len(head)
+        for element, body, end in _elements(head, base, segment[2]):
+            if element == _CLUSTER:
+                header_end = min(header_end, body)
+                break
+            if end > len(head):
+                break
+            if element == _SEEK_HEAD:
+                for seek, seek_body, seek_end in _elements(head, body, end):
+                    if seek != _SEEK:
+                        continue
+                    target = position = None
+                    for child, child_body, child_end in _elements(head, seek_body, seek_end):
+                        if child == _SEEK_ID:
+                            target = _uint(head, child_body, child_end)
+                        elif child == _SEEK_POSITION:
+                            position = _uint(head, child_body, child_end)
+                    if target == _CUES and position is not None:
+                        cues_at = base + position
+            elif element == _INFO:
+                for child, child_body, child_end in _elements(head, body, end):
+                    if child == _TIMECODE_SCALE:
+                        scale = _uint(head, child_body, child_end) or scale
+                    elif child == _DURATION and child_end - child_body in (4, 8):
+                        duration = struct.unpack(
+                            ">f" if child_end - child_body == 4 else ">d", head[child_body:child_end]
+                        )[0]
+        regions = [(0, head[:header_end])]
+        duration = duration * scale / 1e9
+
+        if cues_at is None or cues_at + 12 > file_size:
+            return ContainerIndex("mkv", duration, regions)
+        header = await self._read(file_id, streamer, cues_at, min(cues_at + 11, file_size - 1))
+        element, body, end = next(_elements(header, 0, 1 << 62), (None, 0, 0))
+        if element != _CUES or end - body > self.max_index_bytes:
+            return ContainerIndex("mkv", duration, regions)
+        cues = await self._read(file_id, streamer, cues_at, min(cues_at + end, file_size) - 1)
+        regions.append((cues_at, cues))
+        times, offsets = await asyncio.to_thread(_parse_cues, cues, body, len(cues), base, scale)
+        return ContainerIndex("mkv", duration, regions, times, offsets)
+
+    def stats(self) -> dict:
+        return {
+            "indexed": self.indexed,
+            "failed": self.failed,
+            "indexing": len(self._tasks),
+            "bytes_served": self.bytes_served,
+            "cache": self._cache.stats(),
+        }
+
+
+container_index = ContainerIndexer(Var.INDEX_CACHE_BYTES, Var.INDEX_MAX_BYTES)
@@ -0,0 +1,40 @@
+# (c) ShivamNox - FloodWait cooldown tracking
+import time
+from typing import Dict
+from pyrogram import Client
+
+
+class FloodCooldown:
+    """Tracks which clients are sitting out a FloodWait"""
+    def __init__(self):
+        self._until: Dict[Client, float] = {}
+
+    def start(self, client: Client, seconds: float):
+        until = time.monotonic() + seconds
+        if until > self._until.get(client, 0):
+            self._until[client] = until
+
+    def remaining(self, client: Client) -> float:
+        until = self._until.get(client)
+        if until is None:
+            return 0
+        left = until - time.monotonic()
+        if left <= 0:
+            del self._until[client]
+            return 0
+        return left
+
+    def is_cooling(self, client: Client) -> bool:
+        return self.remaining(client) > 0
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            str(getattr(client, "name", client)): round(left, 1)
+            for client, left in (
+                (client, self.remaining(client)) for client in list(self._until)
+            )
+            if left > 0
+        }
+
+
+cooldowns = FloodCooldown()
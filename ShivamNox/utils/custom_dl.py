@@ -1,17 +1,31 @@
 # (c) ShivamNox - Fixed for high traffic
+import re
 import math
 import asyncio
 import logging
+import itertools
 from ShivamNox.vars import Var
-from typing import Dict, Union, Optional
-from ShivamNox.bot import work_loads
+from typing import Dict, List, Tuple, Union, Optional
+from ShivamNox.bot import work_loads, multi_clients
 from pyrogram import Client, utils, raw
 from .file_properties import get_file_ids
+from .database import Database
+from .cache import TTLCache
+from .disk_cache import ChunkDiskCache
+from .single_flight import SingleFlight
+from .cooldown import cooldowns
+from .balancer import balancer
+from .metadata_store import MetadataStore
+from .byte_budget import ByteBudget
+from .link_token import LinkToken
 from pyrogram.session import Session, Auth
-from pyrogram.errors import AuthBytesInvalid, PeerIdInvalid, ChannelInvalid, FloodWait
-from ShivamNox.server.exceptions import FIleNotFound
+from pyrogram.errors import (
+    AuthBytesInvalid, PeerIdInvalid, ChannelInvalid, FloodWait, FileReferenceExpired
+)
+from ShivamNox.server.exceptions import FIleNotFound, InvalidHash
 from pyrogram.file_id import FileId, FileType, ThumbnailSource
-from collections import OrderedDict
+from collections import deque
+from contextlib import asynccontextmanager
 import time
 
 # Suppress connection error logs
@@ -23,106 +37,123 @@ logging.getLogger("pyrogram.connection").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
-class LRUCache:
-    """Thread-safe LRU Cache with expiration"""
-    def __init__(self, maxsize: int = 1000, ttl: int = 3600):
-        self.cache: OrderedDict = OrderedDict()
-        self.maxsize = maxsize
-        self.ttl = ttl  # Time to live in seconds
-        self._lock = asyncio.Lock()
-    
-    async def get(self, key):
-        async with self._lock:
-            if key in self.cache:
-                value, timestamp = self.cache[key]
-                if time.time() - timestamp < self.ttl:
-                    self.cache.move_to_end(key)
-                    return value
-                else:
-                    del self.cache[key]
-            return None
-    
-    async def set(self, key, value):
-        async with self._lock:
-            if key in self.cache:
-                del self.cache[key]
-            elif len(self.cache) >= self.maxsize:
-                self.cache.popitem(last=False)
-            self.cache[key] = (value, time.time())
-    
-    async def clear(self):
-        async with self._lock:
-            self.cache.clear()
+class PooledSession:
+    """A media session plus its in-flight accounting"""
+    __slots__ = ("session", "in_flight", "requests", "last_used", "retired")
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.in_flight = 0
+        self.requests = 0
+        self.last_used = time.monotonic()
+        self.retired = False
 
 
 class MediaSessionPool:
-    """Connection pool for media sessions"""
-    def __init__(self, max_sessions_per_dc: int = 5):
-        self.sessions: Dict[int, list] = {}  # dc_id -> list of sessions
+    """Connection pool for media sessions, per client and DC"""
+    def __init__(
+        self,
+        max_sessions_per_dc: int = 5,
+        grow_at: int = 4,
+        idle_timeout: int = 300,
+    ):
+        # (client, dc_id) -> list of pooled sessions
+        self.sessions: Dict[Tuple[Client, int], List[PooledSession]] = {}
         self.max_sessions = max_sessions_per_dc
-        self._locks: Dict[int, asyncio.Lock] = {}
-        self._creating: Dict[int, bool] = {}
+        self.grow_at = grow_at  # open another session once all have this many requests
+        self.idle_timeout = idle_timeout
+        self._locks: Dict[Tuple[Client, int], asyncio.Lock] = {}
+        self._last_reap = time.monotonic()
+        self._auth_db: Optional[Database] = None
+    
+    def _get_lock(self, key: Tuple[Client, int]) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+    
+    def _least_busy(self, key: Tuple[Client, int]) -> Optional[PooledSession]:
+        pooled = self.sessions.get(key)
+        if not pooled:
+            return None
+        return min(pooled, key=lambda p: p.in_flight)
     
-    def _get_lock(self, dc_id: int) -> asyncio.Lock:
-        if dc_id not in self._locks:
-            self._locks[dc_id] = asyncio.Lock()
-        return self._locks[dc_id]
+    def _should_grow(self, key: Tuple[Client, int], pooled: Optional[PooledSession]) -> bool:
+        if pooled is None:
+            return True
+        return pooled.in_flight >= self.grow_at and len(self.sessions[key]) < self.max_sessions
     
-    async def get_session(self, client: Client, file_id: FileId) -> Session:
-        """Get or create a media session from the pool"""
-        dc_id = file_id.dc_id
+    async def acquire(self, client: Client, dc_id: int) -> PooledSession:
+        """Take the session with the fewest requests in flight, growing the pool under load"""
+        key = (client, dc_id)
+        pooled = self._least_busy(key)
+        lock = self._get_lock(key)
         
-        async with self._get_lock(dc_id):
-            # Check if we have an existing session
-            if dc_id in self.sessions and self.sessions[dc_id]:
-                # Return least used session (round-robin would be better)
-                return self.sessions[dc_id][0]
-            
-            # Create new session
-            session = await self._create_session(client, file_id)
-            
-            if dc_id not in self.sessions:
-                self.sessions[dc_id] = []
-            
-            if len(self.sessions[dc_id]) < self.max_sessions:
-                self.sessions[dc_id].append(session)
-            
-            return session
+        # While a session is being opened, keep using the ones we have
+        if self._should_grow(key, pooled) and not (pooled and lock.locked()):
+            async with lock:
+                pooled = self._least_busy(key)
+                if self._should_grow(key, pooled):
+                    try:
+                        created = PooledSession(await self._create_session(client, dc_id))
+                    except Exception:
+                        if pooled is None:
+                            raise
+                        logger.debug(f"Could not grow media pool for DC {dc_id}, reusing")
+                    else:
+                        self.sessions.setdefault(key, []).append(created)
+                        pooled = created
+        
+        pooled.in_flight += 1
+        pooled.last_used = time.monotonic()
+        self._maybe_reap()
+        return pooled
+    
+    def release(self, pooled: PooledSession):
+        pooled.in_flight = max(0, pooled.in_flight - 1)
+        pooled.requests += 1
+        pooled.last_used = time.monotonic()
+        if pooled.retired and pooled.in_flight == 0:
+            asyncio.ensure_future(self._stop(pooled.session))
+    
+    def retire(self, client: Client, dc_id: int, session: Session):
+        """Stop handing out a failing session; it is closed once its requests finish"""
+        pooled = self.sessions.get((client, dc_id), [])
+        for p in pooled:
+            if p.session is session:
+                pooled.remove(p)
+                p.retired = True
+                if p.in_flight == 0:
+                    asyncio.ensure_future(self._stop(session))
+                logger.debug(f"Retired media session for DC {dc_id}")
+                break
+    
+    @asynccontextmanager
+    async def session(self, client: Client, dc_id: int):
+        """``async with pool.session(client, dc_id) as session:``"""
+        pooled = await self.acquire(client, dc_id)
+        try:
+            yield pooled.session
+        finally:
+            self.release(pooled)
     
-    async def _create_session(self, client: Client, file_id: FileId) -> Session:
+    async def _create_session(self, client: Client, dc_id: int) -> Session:
         """Create a new media session"""
-        dc_id = file_id.dc_id
-        
-        # Check if client already has a session for this DC
-        if dc_id in client.media_sessions:
-            return client.media_sessions[dc_id]
+        existing = self.sessions.get((client, dc_id))
         
-        if dc_id != await client.storage.dc_id():
+        if existing:
+            # Reuse the auth key that is already authorized on this DC
             media_session = Session(
                 client,
                 dc_id,
-                await Auth(client, dc_id, await client.storage.test_mode()).create(),
+                existing[0].session.auth_key,
                 await client.storage.test_mode(),
                 is_media=True,
             )
             await media_session.start()
-
-            for attempt in range(6):
-                try:
-                    exported_auth = await client.invoke(
-                        raw.functions.auth.ExportAuthorization(dc_id=dc_id)
-                    )
-                    await media_session.send(
-                        raw.functions.auth.ImportAuthorization(
-                            id=exported_auth.id, bytes=exported_auth.bytes
-                        )
-                    )
-                    break
-                except AuthBytesInvalid:
-                    if attempt == 5:
-                        await media_session.stop()
-                        raise
-                    await asyncio.sleep(1)
+        elif dc_id != await client.storage.dc_id():
+            media_session = await self._restore_session(client, dc_id)
+            if media_session is None:
+                media_session = await self._authorize_session(client, dc_id)
         else:
             media_session = Session(
                 client,
@@ -133,45 +164,215 @@ class MediaSessionPool:
             )
             await media_session.start()
         
-        client.media_sessions[dc_id] = media_session
         logger.debug(f"Created media session for DC {dc_id}")
         return media_session
     
+    def _get_auth_db(self) -> Optional[Database]:
+        if self._auth_db is None and Var.PERSIST_MEDIA_AUTH:
+            try:
+                self._auth_db = Database(Var.DATABASE_URL, Var.name)
+            except Exception as e:
+                logger.warning(f"Media auth store unavailable: {e}")
+                Var.PERSIST_MEDIA_AUTH = False
+        return self._auth_db
+    
+    async def _restore_session(self, client: Client, dc_id: int) -> Optional[Session]:
+        """Start a session on a foreign DC with a previously authorized key"""
+        auth_db = self._get_auth_db()
+        if auth_db is None:
+            return None
+        
+        bot_id = await client.storage.user_id()
+        try:
+            auth_key = await auth_db.get_media_auth(bot_id, dc_id)
+        except Exception as e:
+            logger.debug(f"Media auth lookup failed: {e}")
+            return None
+        if not auth_key:
+            return None
+        
+        media_session = Session(
+            client,
+            dc_id,
+            auth_key,
+            await client.storage.test_mode(),
+            is_media=True,
+        )
+        try:
+            await media_session.start()
+            # Fails if the key has been dropped or was never authorized
+            await media_session.send(
+                raw.functions.users.GetUsers(id=[raw.types.InputUserSelf()])
+            )
+        except Exception as e:
+            logger.debug(f"Stored media auth for DC {dc_id} rejected: {e}")
+            await self._stop(media_session)
+            try:
+                await auth_db.delete_media_auth(bot_id, dc_id)
+            except Exception:
+                pass
+            return None
+        
+        logger.debug(f"Restored media session for DC {dc_id}")
+        return media_session
+    
+    async def _authorize_session(self, client: Client, dc_id: int) -> Session:
+        """Create a key on a foreign DC and import the bot's authorization into it"""
+        media_session = Session(
+            client,
+            dc_id,
+            await Auth(client, dc_id, await client.storage.test_mode()).create(),
+            await client.storage.test_mode(),
+            is_media=True,
+        )
+        await media_session.start()
+
+        for attempt in range(6):
+            try:
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+                )
+                await media_session.send(
+                    raw.functions.auth.ImportAuthorization(
+                        id=exported_auth.id, bytes=exported_auth.bytes
+                    )
+                )
+                break
+            except AuthBytesInvalid:
+                if attempt == 5:
+                    await media_session.stop()
+                    raise
+                await asyncio.sleep(1)
+        
+        auth_db = self._get_auth_db()
+        if auth_db is not None:
+            try:
+                await auth_db.set_media_auth(
+                    await client.storage.user_id(), dc_id, media_session.auth_key
+                )
+            except Exception as e:
+                logger.debug(f"Could not persist media auth: {e}")
+        
+        return media_session
+    
+    async def warm_up(self, clients: List[Client]):
+        """Open a media session to every DC for each client in the background"""
+        for client in clients:
+            dc_count = 3 if await client.storage.test_mode() else 5
+            for dc_id in range(1, dc_count + 1):
+                try:
+                    self.release(await self.acquire(client, dc_id))
+                except Exception as e:
+                    logger.debug(f"Warm-up of DC {dc_id} failed: {e}")
+                # Stagger handshakes to stay clear of flood limits
+                await asyncio.sleep(1)
+        logger.info(f"Media sessions warmed: {len(self.sessions)}")
+    
+    def _maybe_reap(self):
+        """Close idle extra sessions, keeping one per client and DC"""
+        now = time.monotonic()
+        if now - self._last_reap < 60:
+            return
+        self._last_reap = now
+        
+        idle = []
+        for pooled in self.sessions.values():
+            for p in list(pooled[1:]):
+                if p.in_flight == 0 and now - p.last_used > self.idle_timeout:
+                    pooled.remove(p)
+                    idle.append(p.session)
+        
+        for session in idle:
+            asyncio.ensure_future(self._stop(session))
+    
+    @staticmethod
+    async def _stop(session: Session):
+        try:
+            await session.stop()
+        except Exception:
+            pass
+    
+    def stats(self) -> dict:
+        return {
+            f"{getattr(client, 'name', client)}:dc{dc_id}": {
+                "sessions": len(pooled),
+                "in_flight": [p.in_flight for p in pooled],
+                "requests": sum(p.requests for p in pooled),
+            }
+            for (client, dc_id), pooled in self.sessions.items()
+        }
+    
     async def close_all(self):
         """Close all sessions"""
-        for dc_id, sessions in self.sessions.items():
-            for session in sessions:
-                try:
-                    await session.stop()
-                except Exception:
-                    pass
+        for pooled in self.sessions.values():
+            for p in pooled:
+                await self._stop(p.session)
         self.sessions.clear()
 
 
+CHUNK_SIZE = 1024 * 1024
+
 # Global instances
-_file_cache = LRUCache(maxsize=2000, ttl=3600)
-_session_pool = MediaSessionPool(max_sessions_per_dc=3)
+def _file_id_size(file_id: FileId) -> int:
+    """Rough footprint of a cached FileId and its attributes"""
+    return 512 + len(file_id.file_reference or b"") + len(getattr(file_id, "file_name", "") or "")
+
+
+_file_cache = TTLCache(max_bytes=Var.FILE_CACHE_BYTES, ttl=3600, sizeof=_file_id_size)
+# Message ids known to be missing, and (id, hash) pairs known to be wrong.
+# Keys are an int or an int and a 6-character hash, hence the flat size.
+_negative_cache = TTLCache(max_bytes=4 * 1024 * 1024, ttl=Var.NEGATIVE_CACHE_TTL, sizeof=lambda _: 128)
+_session_pool = MediaSessionPool(max_sessions_per_dc=Var.MAX_SESSIONS_PER_DC)
+_disk_cache = ChunkDiskCache(Var.CACHE_DIR, Var.CACHE_MAX_BYTES)
+_single_flight = SingleFlight(hot_bytes=Var.HOT_CACHE_BYTES)
+_metadata_store = MetadataStore(max_age=Var.METADATA_MAX_AGE)
+_stream_budget = ByteBudget(Var.STREAM_BUFFER_BYTES)
+
+# Message id -> in-flight file reference refresh
+_refreshing: Dict[int, asyncio.Task] = {}
+
+# Live per-stream stats (stream id -> dict), shown on the status route
+active_streams: Dict[int, dict] = {}
+_stream_ids = itertools.count(1)
+failover_stats = {"recovered": 0, "failed": 0}
+# Parts fetched below CHUNK_SIZE, and how many came out of a cached chunk
+fetch_stats = {"small_parts": 0, "sliced": 0, "bytes_saved": 0}
 
 
 class ByteStreamer:
     def __init__(self, client: Client):
         """A custom class that holds the cache of a specific client and class functions."""
         self.client: Client = client
-        self.cached_file_ids: Dict[int, FileId] = {}
+        self.cached_file_ids = TTLCache(
+            max_bytes=Var.FILE_CACHE_BYTES // 4, ttl=3600, sizeof=_file_id_size
+        )
         # Use global cache instead of per-instance
         self._cache = _file_cache
         self._session_pool = _session_pool
+        # Caps concurrent GetFile calls on this bot across all its streams
+        self._inflight = asyncio.Semaphore(Var.CLIENT_MAX_INFLIGHT)
 
     async def get_file_properties(self, id: int) -> FileId:
         """Get file properties with caching"""
+        if _negative_cache.get(id):
+            raise FIleNotFound
+        
         # Check global cache first
-        cached = await self._cache.get(f"{id}")
+        cached = self._cache.get(id)
         if cached:
             return cached
         
         # Check local cache
-        if id in self.cached_file_ids:
-            return self.cached_file_ids[id]
+        cached = self.cached_file_ids.get(id)
+        if cached:
+            return cached
+        
+        # Check the persistent store
+        file_id = await _metadata_store.get(id)
+        if file_id:
+            self.cached_file_ids.set(id, file_id)
+            self._cache.set(id, file_id)
+            return file_id
         
         # Generate new
         file_id = await self.generate_file_properties(id)
@@ -193,9 +394,10 @@ class ByteStreamer:
                 if not file_id:
                     raise FIleNotFound
                 
-                # Cache in both local and global cache
-                self.cached_file_ids[id] = file_id
-                await self._cache.set(f"{id}", file_id)
+                # Cache in both local and global cache, persist behind
+                self.cached_file_ids.set(id, file_id)
+                self._cache.set(id, file_id)
+                _metadata_store.put(id, file_id)
                 
                 return file_id
                 
@@ -211,6 +413,8 @@ class ByteStreamer:
                 await asyncio.sleep(e.value)
                 
             except FIleNotFound:
+                # Confirmed deleted or not media; don't ask Telegram again for a while
+                _negative_cache.set(id, True)
                 raise
                 
             except Exception as e:
@@ -222,9 +426,121 @@ class ByteStreamer:
         logger.error(f"Failed after {max_retries} attempts: {last_error}")
         raise FIleNotFound
 
-    async def generate_media_session(self, client: Client, file_id: FileId) -> Session:
-        """Get media session from pool"""
-        return await self._session_pool.get_session(client, file_id)
+    async def fetch_part(self, file_id: FileId, offset: int, limit: int) -> Optional[bytes]:
+        """Fetch one part, sharing the upstream call with identical concurrent fetches"""
+        media_id = getattr(file_id, "media_id", None)
+        if media_id is None:
+            return await self._fetch_part(file_id, offset, limit)
+        if limit < CHUNK_SIZE:
+            fetch_stats["small_parts"] += 1
+            fetch_stats["bytes_saved"] += CHUNK_SIZE - limit
+            # A cached whole chunk beats any upstream call, however small
+            block = offset - offset % CHUNK_SIZE
+            chunk = await self._cached_chunk(media_id, block)
+            if chunk is not None:
+                fetch_stats["sliced"] += 1
+                start = offset - block
+                return chunk[start:start + limit]
+        return await _single_flight.fetch(
+            (media_id, offset, limit),
+            lambda: self._fetch_part(file_id, offset, limit),
+        )
+
+    @staticmethod
+    async def _cached_chunk(media_id: int, offset: int) -> Optional[bytes]:
+        """A whole chunk from the RAM or disk cache, without going upstream"""
+        chunk = _single_flight.peek((media_id, offset, CHUNK_SIZE))
+        if chunk is None and _disk_cache.enabled:
+            # An opportunistic probe, so it mustn't count as a cache miss
+            chunk = await _disk_cache.peek((media_id, offset))
+        return chunk
+
+    async def _fetch_part(self, file_id: FileId, offset: int, limit: int) -> Optional[bytes]:
+        """Fetch one part, from the disk cache or this client's media session"""
+        media_id = getattr(file_id, "media_id", None)
+        key = (media_id, offset)
+        cacheable = _disk_cache.enabled and media_id is not None and limit == CHUNK_SIZE
+        
+        if cacheable:
+            chunk = await _disk_cache.get(key)
+            if chunk:
+                return chunk
+        
+        try:
+            async with self._inflight:
+                async with self._session_pool.session(self.client, file_id.dc_id) as media_session:
+                    for attempt in range(2):
+                        reference = file_id.file_reference
+                        location = await self.get_location(file_id)
+                        started = time.monotonic()
+                        try:
+                            chunk = await self._fetch_chunk_with_retry(
+                                media_session, location, offset, limit
+                            )
+                        except FloodWait as e:
+                            # Cool the whole bot down; its streams move to other bots
+                            logger.warning(f"FloodWait in chunk fetch: {e.value}s, draining client")
+                            cooldowns.start(self.client, e.value)
+                            return None
+                        except FileReferenceExpired:
+                            # A cached or stored FileId outlived its reference; the
+                            # session is fine, so retry once with a fresh one
+                            if attempt or not await self.refresh_file_reference(file_id, reference):
+                                return None
+                            continue
+                        break
+                    if chunk is None:
+                        # Make the next attempt go through a fresh connection
+                        self._session_pool.retire(self.client, file_id.dc_id, media_session)
+                    elif limit == CHUNK_SIZE:
+                        # Small parts are mostly round trip; scaled up to a
+                        # per-MB figure they would swamp the latency estimate
+                        balancer.observe(
+                            self.client, file_id.dc_id, time.monotonic() - started, limit
+                        )
+        except Exception as e:
+            # Session setup can fail too (auth export/import, connect);
+            # treat it as a failed part so the stream fails over
+            logger.warning(f"Part fetch failed on this client: {type(e).__name__}: {e}")
+            return None
+        
+        if cacheable and chunk:
+            # Write behind so the stream isn't held up by the disk
+            asyncio.ensure_future(_disk_cache.put(key, chunk))
+        return chunk
+
+    async def refresh_file_reference(self, file_id: FileId, stale: bytes) -> bool:
+        """
+        Give ``file_id`` a fresh file_reference after Telegram rejected ``stale``.
+
+        The message is looked up again once however many fetches hit the
+        expiry together, and the new reference is written into ``file_id``
+        itself so every stream holding it picks it up.
+        """
+        if file_id.file_reference != stale:
+            # Another fetch already refreshed it
+            return True
+        id = getattr(file_id, "message_id", None)
+        if id is None:
+            return False
+        task = _refreshing.get(id)
+        if task is None:
+            task = _refreshing[id] = asyncio.ensure_future(self._refetch_file_id(id))
+            task.add_done_callback(lambda _: _refreshing.pop(id, None))
+        try:
+            fresh = await asyncio.shield(task)
+        except Exception as e:
+            logger.warning(f"Could not refresh file reference of {id}: {e}")
+            return False
+        file_id.file_reference = fresh.file_reference
+        return True
+
+    async def _refetch_file_id(self, id: int) -> FileId:
+        _file_cache.pop(id)
+        for streamer in class_cache.values():
+            streamer.cached_file_ids.pop(id)
+        await _metadata_store.forget(id)
+        return await self.generate_file_properties(id)
 
     @staticmethod
     async def get_location(file_id: FileId) -> Union[
@@ -271,50 +587,112 @@ class ByteStreamer:
             )
         return location
 
-    async def yield_file(
+    async def yield_parts(
         self,
         file_id: FileId,
         index: int,
-        offset: int,
-        first_part_cut: int,
-        last_part_cut: int,
-        part_count: int,
-        chunk_size: int,
+        parts: List[Tuple[int, int, int, int]],
+        helpers: Optional[List["ByteStreamer"]] = None,
     ) -> Union[str, None]:
         """
         Generator that yields file chunks with proper error handling.
         Supports multiple concurrent users.
+
+        ``parts`` is a list of (offset, limit, start, end): fetch ``limit``
+        bytes at ``offset`` and yield ``chunk[start:end]``. Neighbouring
+        parts with the same offset and limit share one fetch, so several
+        ranges are served in a single upstream pass.
+
+        Keeps up to ``Var.READ_AHEAD`` GetFile requests in flight and hands
+        the chunks out in order; pending requests are cancelled when the
+        client goes away. When ``helpers`` are given, parts are striped
+        round-robin over this client and the helpers.
+
+        Every fetch holds its size in the process-wide stream budget until
+        the consumer asks for the next chunk, so read-ahead only runs as
+        fast as clients drain.
         """
-        client = self.client
+        part_count = len(parts)
         work_loads[index] = work_loads.get(index, 0) + 1
+        outstanding = sum(end - start for _, _, start, end in parts)
+        balancer.add(self.client, outstanding)
         
-        media_session = None
+        stripe = [self] + list(helpers or [])
         current_part = 1
+        window = max(1, min(Var.READ_AHEAD * len(stripe), part_count))
+        pending: deque = deque()
+        stream_id = next(_stream_ids)
+        active_streams[stream_id] = {
+            "client": index,
+            "read_ahead": window,
+            "stripe": len(stripe),
+            "parts": part_count,
+            "sent": 0,
+            "failovers": 0,
+        }
         
+        held = 0
         try:
-            media_session = await self.generate_media_session(client, file_id)
-            location = await self.get_location(file_id)
+            scheduled = 0
+            fetches = 0
+            last_fetch = None
+
+            def schedule(reserved: bool = False):
+                nonlocal scheduled, fetches, last_fetch
+                while scheduled < part_count and len(pending) < window:
+                    part = parts[scheduled]
+                    part_offset, limit = part[0], part[1]
+                    cost = limit if reserved else 0
+                    if last_fetch is not None and last_fetch[0] == (part_offset, limit):
+                        # Same bytes as the previous part: reuse its fetch
+                        task, streamer = last_fetch[1], last_fetch[2]
+                    else:
+                        if not reserved and not _stream_budget.try_acquire(limit):
+                            return
+                        cost = limit
+                        streamer = stripe[fetches % len(stripe)]
+                        if cooldowns.is_cooling(streamer.client):
+                            streamer = self._healthy_streamer() or streamer
+                        task = asyncio.ensure_future(
+                            streamer.fetch_part(file_id, part_offset, limit)
+                        )
+                        last_fetch = ((part_offset, limit), task, streamer)
+                        fetches += 1
+                    reserved = False
+                    pending.append((task, part, streamer, cost))
+                    scheduled += 1
+
+            schedule()
             
-            while current_part <= part_count:
-                chunk = await self._fetch_chunk_with_retry(
-                    media_session, location, offset, chunk_size
-                )
+            while pending or scheduled < part_count:
+                if not pending:
+                    # Out of budget: wait for other streams to drain
+                    await _stream_budget.acquire(parts[scheduled][1])
+                    schedule(reserved=True)
+                task, (part_offset, limit, cut_start, cut_end), streamer, held = pending.popleft()
+                chunk = await task
                 
                 if chunk is None:
-                    break
+                    # Refetch the same bytes elsewhere rather than truncate
+                    chunk = await self._failover(file_id, part_offset, limit, streamer)
+                    if chunk is None:
+                        failover_stats["failed"] += 1
+                        break
+                    failover_stats["recovered"] += 1
+                    active_streams[stream_id]["failovers"] += 1
                 
-                # Process chunk based on position
-                if part_count == 1:
-                    yield chunk[first_part_cut:last_part_cut]
-                elif current_part == 1:
-                    yield chunk[first_part_cut:]
-                elif current_part == part_count:
-                    yield chunk[:last_part_cut]
-                else:
-                    yield chunk
+                # Refill the window before handing the chunk out
+                schedule()
+                
+                chunk = chunk[cut_start:cut_end]
+                balancer.add(self.client, -len(chunk))
+                outstanding -= len(chunk)
+                yield chunk
+                _stream_budget.release(held)
+                held = 0
 
+                active_streams[stream_id]["sent"] = current_part
                 current_part += 1
-                offset += chunk_size
                 
         except asyncio.CancelledError:
             # Client cancelled the request (closed browser)
@@ -325,8 +703,68 @@ class ByteStreamer:
         except Exception as e:
             logger.warning(f"Stream error: {e}")
         finally:
+            for task, _, _, cost in pending:
+                task.cancel()
+                held += cost
+            _stream_budget.release(held)
+            active_streams.pop(stream_id, None)
+            balancer.add(self.client, -outstanding)
             work_loads[index] = max(0, work_loads.get(index, 1) - 1)
-            logger.debug(f"Stream completed: {current_part - 1} parts sent")
+            logger.debug(
+                f"Stream completed: {current_part - 1} parts sent "
+                f"(read-ahead {window})"
+            )
+
+    @staticmethod
+    def _healthy_streamer() -> Optional["ByteStreamer"]:
+        """Least loaded bot that is not in FloodWait"""
+        ready = [
+            (work_loads.get(index, 0), index, client)
+            for index, client in list(multi_clients.items())
+            if not cooldowns.is_cooling(client)
+        ]
+        if not ready:
+            return None
+        return streamer_for(min(ready, key=lambda r: r[:2])[2])
+
+    async def _failover(
+        self, file_id: FileId, offset: int, limit: int, failed: "ByteStreamer"
+    ) -> Optional[bytes]:
+        """Refetch a failed part through other sessions and bots until the deadline"""
+        others = [
+            streamer_for(client)
+            for client in list(multi_clients.values())
+            if client is not failed.client
+        ]
+        # The failed bot goes last; its broken session has been retired
+        candidates = others + [failed]
+        deadline = time.monotonic() + Var.FAILOVER_DEADLINE
+        attempt = 0
+        
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ready = [c for c in candidates if not cooldowns.is_cooling(c.client)]
+            if not ready:
+                # Every bot is in FloodWait; wait for the first to come back
+                await asyncio.sleep(min(1, remaining))
+                continue
+            streamer = ready[attempt % len(ready)]
+            attempt += 1
+            try:
+                chunk = await asyncio.wait_for(
+                    streamer._fetch_part(file_id, offset, limit), timeout=remaining
+                )
+            except asyncio.TimeoutError:
+                break
+            if chunk:
+                logger.debug(f"Failover recovered offset {offset} after {attempt} attempt(s)")
+                return chunk
+            await asyncio.sleep(min(1, max(0, deadline - time.monotonic())))
+        
+        logger.warning(f"Failover gave up on offset {offset}")
+        return None
 
     async def _fetch_chunk_with_retry(
         self, 
@@ -363,9 +801,9 @@ class ByteStreamer:
                     logger.debug("Chunk timeout after all retries")
                     return None
                     
-            except FloodWait as e:
-                logger.warning(f"FloodWait in chunk fetch: {e.value}s")
-                await asyncio.sleep(e.value)
+            except (FloodWait, FileReferenceExpired):
+                # Handled by the caller: drain this client, or refresh the reference
+                raise
                 
             except (OSError, BrokenPipeError, ConnectionResetError) as e:
                 # Connection error - client likely disconnected
@@ -383,7 +821,92 @@ class ByteStreamer:
         return None
 
 
+# ByteStreamer instances per client
+class_cache: Dict[Client, ByteStreamer] = {}
+_cache_lock = asyncio.Lock()
+
+
+def streamer_for(client: Client) -> ByteStreamer:
+    """Get or create ByteStreamer for a client"""
+    if client not in class_cache:
+        class_cache[client] = ByteStreamer(client)
+    return class_cache[client]
+
+
+async def get_streamer(client: Client) -> ByteStreamer:
+    """Get or create ByteStreamer for a client (thread-safe)"""
+    async with _cache_lock:
+        return streamer_for(client)
+
+
+# Link hashes are the first 6 characters of a file_unique_id
+_HASH = re.compile(r"[a-zA-Z0-9_-]{6}")
+
+
+def well_formed_hash(secure_hash: Optional[str]) -> bool:
+    return secure_hash is not None and _HASH.fullmatch(secure_hash) is not None
+
+
+def reject_known_bad(id: int, secure_hash: Optional[str]):
+    """
+    Fail fast on links that recently turned out to be missing or mis-hashed.
+
+    ``secure_hash`` None means the link was verified some other way (a
+    signed token); any other value must look like a link hash.
+    """
+    if secure_hash is not None and not well_formed_hash(secure_hash):
+        raise InvalidHash
+    if _negative_cache.get(id):
+        raise FIleNotFound
+    if secure_hash is not None and _negative_cache.get((id, secure_hash)):
+        raise InvalidHash
+
+
+def remember_bad_hash(id: int, secure_hash: Optional[str]):
+    # Only fixed-size keys, so the flat entry size below holds
+    if well_formed_hash(secure_hash):
+        _negative_cache.set((id, secure_hash), True)
+
+
+async def get_verified_file(
+    id: int, secure_hash: Optional[str], token: Optional[LinkToken] = None
+):
+    """Look the file up through the shared caches and check the link's hash"""
+    if token is None and not well_formed_hash(secure_hash):
+        raise InvalidHash
+    
+    # Any healthy bot can look the file up; the metadata cache is shared
+    _, client = balancer.pick()
+    tg_connect = await get_streamer(client or multi_clients.get(0))
+    
+    # Get file properties with timeout
+    try:
+        file_id = await asyncio.wait_for(
+            tg_connect.get_file_properties(id),
+            timeout=30
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Timeout getting file properties for {id}")
+        raise FIleNotFound
+    
+    # Verify hash (a signed token has already been verified)
+    if token is None and file_id.unique_id[:6] != secure_hash:
+        remember_bad_hash(id, secure_hash)
+        raise InvalidHash
+    
+    return file_id
+
+
+async def warm_file_cache():
+    """Load the most recently resolved file metadata into the in-memory cache"""
+    warmed = await _metadata_store.recent(Var.METADATA_WARM_COUNT)
+    for id, file_id in reversed(warmed):
+        _file_cache.set(id, file_id)
+    logger.info(f"File cache warmed with {len(warmed)} entries")
+
+
 async def cleanup_sessions():
     """Cleanup function to be called on shutdown"""
+    await _metadata_store.flush()
     await _session_pool.close_all()
-    await _file_cache.clear()
+    _file_cache.clear()
@@ -1,6 +1,7 @@
 #(c) ShivamNox
 import datetime
 import motor.motor_asyncio
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 
 
 class Database:
@@ -8,6 +9,13 @@ class Database:
         self._client = motor.motor_asyncio.AsyncIOMotorClient(uri)
         self.db = self._client[database_name]
         self.col = self.db.users
+        self.media_auth = self.db.media_auth
+        self.file_meta = self.db.file_meta
+
+    async def ensure_indexes(self):
+        await self.file_meta.create_index([('id', ASCENDING)], unique=True)
+        await self.file_meta.create_index([('saved', DESCENDING)])
+        await self.media_auth.create_index([('bot_id', ASCENDING), ('dc_id', ASCENDING)])
 
     def new_user(self, id):
         return dict(
@@ -41,3 +49,32 @@ class Database:
 
     async def delete_user(self, user_id):
         await self.col.delete_many({'id': int(user_id)})
+
+    async def get_media_auth(self, bot_id, dc_id):
+        auth = await self.media_auth.find_one({'bot_id': int(bot_id), 'dc_id': int(dc_id)})
+        return auth.get('auth_key') if auth else None
+
+    async def set_media_auth(self, bot_id, dc_id, auth_key):
+        await self.media_auth.update_one(
+            {'bot_id': int(bot_id), 'dc_id': int(dc_id)},
+            {'$set': {'auth_key': auth_key}},
+            upsert=True
+        )
+
+    async def delete_media_auth(self, bot_id, dc_id):
+        await self.media_auth.delete_many({'bot_id': int(bot_id), 'dc_id': int(dc_id)})
+
+    async def get_file_meta(self, id):
+        return await self.file_meta.find_one({'id': int(id)})
+
+    async def save_file_meta(self, metas):
+        await self.file_meta.bulk_write(
+            [UpdateOne({'id': meta['id']}, {'$set': meta}, upsert=True) for meta in metas],
+            ordered=False
+        )
+
+    async def delete_file_meta(self, id):
+        await self.file_meta.delete_one({'id': int(id)})
+
+    async def get_recent_file_meta(self, limit):
+        return await self.file_meta.find({}).sort('saved', -1).to_list(length=limit)
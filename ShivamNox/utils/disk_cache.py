@@ -0,0 +1,168 @@
+# (c) ShivamNox - On-disk chunk cache
+import os
+import mmap
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkDiskCache:
+    """
+    LRU cache of downloaded chunks on local disk, keyed by (media_id, offset).
+
+    Every chunk is its own file, written under a temporary name and renamed
+    into place, so a crash never leaves a torn chunk behind. The directory
+    itself is the index: it is rescanned on startup and ordered by mtime,
+    which every hit bumps, so the rebuilt LRU order follows the last reads.
+    """
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()  # key -> size on disk
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loaded = False
+        self._writing = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._loaded and self.max_bytes > 0
+
+    def _file(self, key: Tuple[int, int]) -> str:
+        return os.path.join(self.path, f"{key[0]}_{key[1]}.chunk")
+
+    def _scan(self) -> list:
+        os.makedirs(self.path, exist_ok=True)
+        found = []
+        for name in os.listdir(self.path):
+            full = os.path.join(self.path, name)
+            if name.endswith(".tmp"):
+                # Left over from an interrupted write
+                try:
+                    os.remove(full)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(".chunk"):
+                continue
+            try:
+                media_id, offset = name[:-6].rsplit("_", 1)
+                st = os.stat(full)
+            except (ValueError, OSError):
+                continue
+            found.append((st.st_mtime, (int(media_id), int(offset)), st.st_size))
+        found.sort()
+        return found
+
+    async def load(self):
+        """Rebuild the index from the cache directory"""
+        if self.max_bytes <= 0:
+            return
+        try:
+            found = await asyncio.to_thread(self._scan)
+        except OSError as e:
+            logger.warning(f"Disk cache disabled: {e}")
+            return
+        for _, key, size in found:
+            self.entries[key] = size
+            self.size += size
+        self._loaded = True
+        await self._evict()
+        logger.info(f"Disk cache: {len(self.entries)} chunks, {self.size} bytes")
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                data = m[:]
+        try:
+            # Record the access for the next startup's LRU order
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    async def get(self, key: Tuple[int, int]) -> Optional[bytes]:
+        data = await self.peek(key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def peek(self, key: Tuple[int, int]) -> Optional[bytes]:
+        """Like get, but not counted in the hit/miss stats"""
+        if key not in self.entries:
+            return None
+        try:
+            data = await asyncio.to_thread(self._read, self._file(key))
+        except (OSError, ValueError):
+            # Evicted or removed underneath us
+            self._drop(key)
+            return None
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        return data
+
+    async def put(self, key: Tuple[int, int], data: bytes):
+        if not self.enabled or not data or key in self.entries or key in self._writing:
+            return
+        if len(data) > self.max_bytes:
+            return
+        self._writing.add(key)
+        try:
+            await asyncio.to_thread(self._write, self._file(key), data)
+            self.entries[key] = len(data)
+            self.size += len(data)
+        except OSError as e:
+            logger.warning(f"Disk cache write failed: {e}")
+        finally:
+            self._writing.discard(key)
+        await self._evict()
+
+    def _drop(self, key: Tuple[int, int]):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.size -= size
+
+    async def _evict(self):
+        victims = []
+        while self.size > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            victims.append(self._file(key))
+        if victims:
+            await asyncio.to_thread(self._remove, victims)
+
+    @staticmethod
+    def _remove(paths: list):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -1,18 +1,104 @@
 # (c) ShivamNox
 from pyrogram import Client
 from pyrogram.errors import PeerIdInvalid, ChannelInvalid
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from pyrogram.types import Message
 from pyrogram.file_id import FileId
 from pyrogram.raw.types.messages import Messages
 from ShivamNox.server.exceptions import FIleNotFound
 from ShivamNox.vars import Var
+import time
 import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class _Batch:
+    __slots__ = ("waiters", "started", "timer")
+
+    def __init__(self):
+        self.waiters: Dict[int, List[asyncio.Future]] = {}
+        self.started = time.monotonic()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MessageBatcher:
+    """
+    Gathers concurrent get_messages lookups for the same chat into one call.
+
+    A batch is sent ``window`` seconds after its first lookup, or as soon as
+    it holds ``max_batch`` ids (Telegram's limit per call).
+    """
+    def __init__(self, window: float = 0.005, max_batch: int = 200):
+        self.window = window
+        self.max_batch = max_batch
+        self._batches: Dict[Tuple[Client, int], _Batch] = {}
+        self.batches = 0
+        self.lookups = 0
+        self.largest = 0
+        self.wait_total = 0.0
+
+    async def get(self, client: Client, chat_id: int, id: int) -> Message:
+        loop = asyncio.get_running_loop()
+        key = (client, chat_id)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch()
+            batch.timer = loop.call_later(self.window, self._fire, key)
+        
+        future = loop.create_future()
+        batch.waiters.setdefault(int(id), []).append(future)
+        self.lookups += 1
+        if len(batch.waiters) >= self.max_batch:
+            self._fire(key)
+        return await future
+
+    def _fire(self, key: Tuple[Client, int]):
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self.batches += 1
+        self.largest = max(self.largest, len(batch.waiters))
+        self.wait_total += time.monotonic() - batch.started
+        asyncio.ensure_future(self._send(key, batch))
+
+    async def _send(self, key: Tuple[Client, int], batch: _Batch):
+        client, chat_id = key
+        try:
+            messages = await client.get_messages(chat_id, list(batch.waiters))
+        except Exception as e:
+            for futures in batch.waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        
+        found = {message.id: message for message in messages if message}
+        for id, futures in batch.waiters.items():
+            message = found.get(id)
+            for future in futures:
+                if future.done():
+                    continue
+                if message is None:
+                    future.set_exception(FIleNotFound())
+                else:
+                    future.set_result(message)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "lookups": self.lookups,
+            "avg_batch": round(self.lookups / self.batches, 2) if self.batches else 0,
+            "max_batch": self.largest,
+            "avg_wait_ms": round(self.wait_total / self.batches * 1000, 2) if self.batches else 0,
+        }
+
+
+message_batcher = MessageBatcher(window=Var.BATCH_WINDOW_MS / 1000)
+
+
 async def parse_file_id(message: "Message") -> Optional[FileId]:
     media = get_media_from_message(message)
     if media:
@@ -35,7 +121,7 @@ async def get_file_ids(client: Client, chat_id: int, id: int) -> Optional[FileId
             logger.warning(f"Channel check warning: {e}")
     
     try:
-        message = await client.get_messages(chat_id, id)
+        message = await message_batcher.get(client, chat_id, id)
         
         if message.empty:
             raise FIleNotFound
@@ -51,6 +137,8 @@ async def get_file_ids(client: Client, chat_id: int, id: int) -> Optional[FileId
         setattr(file_id, "mime_type", getattr(media, "mime_type", ""))
         setattr(file_id, "file_name", getattr(media, "file_name", ""))
         setattr(file_id, "unique_id", file_unique_id)
+        setattr(file_id, "date", int(message.date.timestamp()) if message.date else 0)
+        setattr(file_id, "message_id", int(id))
         
         return file_id
         
@@ -62,7 +150,7 @@ async def get_file_ids(client: Client, chat_id: int, id: int) -> Optional[FileId
         await asyncio.sleep(2)
         
         if await ensure_bin_channel(client, chat_id):
-            message = await client.get_messages(chat_id, id)
+            message = await message_batcher.get(client, chat_id, id)
             
             if message.empty:
                 raise FIleNotFound
@@ -78,10 +166,13 @@ async def get_file_ids(client: Client, chat_id: int, id: int) -> Optional[FileId
             setattr(file_id, "mime_type", getattr(media, "mime_type", ""))
             setattr(file_id, "file_name", getattr(media, "file_name", ""))
             setattr(file_id, "unique_id", file_unique_id)
+            setattr(file_id, "date", int(message.date.timestamp()) if message.date else 0)
+            setattr(file_id, "message_id", int(id))
             
             return file_id
         
-        raise FIleNotFound
+        # The channel is still unresolved, which says nothing about the file
+        raise
 
 
 def get_media_from_message(message: "Message") -> Any:
@@ -114,3 +205,8 @@ def get_name(media_msg: Message) -> str:
 def get_media_file_size(m):
     media = get_media_from_message(m)
     return getattr(media, "file_size", 0)
+
+
+def get_mime_type(media_msg: Message) -> str:
+    media = get_media_from_message(media_msg)
+    return getattr(media, "mime_type", "") or ""
@@ -0,0 +1,63 @@
+# (c) ShivamNox - Signed v2 link tokens
+import hmac
+import time
+import base64
+import struct
+import hashlib
+from typing import NamedTuple, Optional
+from ShivamNox.vars import Var
+
+_HEADER = struct.Struct(">QQI")  # message id, file size, expiry (0 = never)
+
+
+class LinkToken(NamedTuple):
+    id: int
+    size: int
+    mime: str
+    expires: int
+
+
+def _secret() -> bytes:
+    if Var.LINK_SECRET:
+        return Var.LINK_SECRET.encode()
+    # Stable per deployment without extra configuration
+    return hashlib.sha256(f"v2-links:{Var.BOT_TOKEN}".encode()).digest()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_secret(), payload, hashlib.sha256).digest()[:16]
+
+
+def sign_link(id: int, size: int, mime: str = "", ttl: int = 0) -> str:
+    """Token carrying everything needed to answer HEAD and range checks"""
+    expires = int(time.time()) + ttl if ttl else 0
+    payload = _HEADER.pack(int(id), int(size or 0), expires) + (mime or "").encode()[:255]
+    return f"{_b64(payload)}.{_b64(_sign(payload))}"
+
+
+def verify_link(token: str) -> Optional[LinkToken]:
+    """Decode a token, or None if it is malformed, forged or expired"""
+    try:
+        payload_b64, sig_b64 = token.split(".", 1)
+        payload = _unb64(payload_b64)
+        signature = _unb64(sig_b64)
+    except (ValueError, TypeError):
+        return None
+    if len(payload) < _HEADER.size or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    id, size, expires = _HEADER.unpack_from(payload)
+    if expires and expires < time.time():
+        return None
+    try:
+        mime = payload[_HEADER.size:].decode()
+    except UnicodeDecodeError:
+        return None
+    return LinkToken(id, size, mime, expires)
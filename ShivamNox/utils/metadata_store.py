@@ -0,0 +1,138 @@
+# (c) ShivamNox - Persistent file metadata
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from pyrogram.file_id import FileId
+from ShivamNox.vars import Var
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataStore:
+    """
+    Keeps the FileId and file details of every BIN_CHANNEL message in MongoDB,
+    so a restart doesn't cost one get_messages call per link.
+
+    Lookups hit the database only on an in-memory miss, and new entries are
+    written behind in batches. Entries older than ``max_age`` are ignored,
+    since Telegram file references eventually expire.
+    """
+    def __init__(self, flush_interval: float = 5, max_age: int = 86400):
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self._db: Optional[Database] = None
+        self._dirty: Dict[int, dict] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.writes = 0
+
+    def _get_db(self) -> Optional[Database]:
+        if self._db is None and Var.PERSIST_METADATA:
+            try:
+                self._db = Database(Var.DATABASE_URL, Var.name)
+            except Exception as e:
+                logger.warning(f"Metadata store unavailable: {e}")
+                Var.PERSIST_METADATA = False
+        return self._db
+
+    @staticmethod
+    def _encode(id: int, file_id: FileId) -> dict:
+        return {
+            'id': int(id),
+            'file_id': file_id.encode(),
+            'size': getattr(file_id, "file_size", 0),
+            'mime': getattr(file_id, "mime_type", ""),
+            'name': getattr(file_id, "file_name", ""),
+            'unique_id': getattr(file_id, "unique_id", ""),
+            'date': getattr(file_id, "date", 0),
+            'saved': time.time(),
+        }
+
+    def _decode(self, meta: dict) -> Optional[FileId]:
+        if time.time() - meta.get('saved', 0) > self.max_age:
+            return None
+        try:
+            file_id = FileId.decode(meta['file_id'])
+        except Exception:
+            return None
+        setattr(file_id, "file_size", meta.get('size', 0))
+        setattr(file_id, "mime_type", meta.get('mime', ""))
+        setattr(file_id, "file_name", meta.get('name', ""))
+        setattr(file_id, "unique_id", meta.get('unique_id', ""))
+        setattr(file_id, "date", meta.get('date', 0))
+        setattr(file_id, "message_id", meta['id'])
+        return file_id
+
+    async def get(self, id: int) -> Optional[FileId]:
+        db = self._get_db()
+        if db is None:
+            return None
+        try:
+            meta = await db.get_file_meta(id)
+        except Exception as e:
+            logger.debug(f"Metadata lookup failed: {e}")
+            return None
+        file_id = self._decode(meta) if meta else None
+        if file_id is not None:
+            self.loads += 1
+        return file_id
+
+    def put(self, id: int, file_id: FileId):
+        if self._get_db() is None:
+            return
+        self._dirty[int(id)] = self._encode(id, file_id)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_later())
+
+    async def forget(self, id: int):
+        """Drop an entry whose file reference Telegram no longer accepts"""
+        self._dirty.pop(int(id), None)
+        db = self._get_db()
+        if db is None:
+            return
+        try:
+            await db.delete_file_meta(id)
+        except Exception as e:
+            logger.debug(f"Metadata delete failed: {e}")
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        metas = list(self._dirty.values())
+        self._dirty.clear()
+        try:
+            await self._db.save_file_meta(metas)
+            self.writes += len(metas)
+        except Exception as e:
+            logger.warning(f"Metadata write failed: {e}")
+
+    async def recent(self, limit: int) -> List[Tuple[int, FileId]]:
+        """
+        Most recently resolved entries, for warming the in-memory cache.
+
+        Ordered by ``saved``, which is not bumped on reads: it also dates the
+        file reference, so refreshing it would keep stale references alive.
+        """
+        db = self._get_db()
+        if db is None or limit <= 0:
+            return []
+        try:
+            metas = await db.get_recent_file_meta(limit)
+        except Exception as e:
+            logger.warning(f"Metadata warm-up failed: {e}")
+            return []
+        result = []
+        for meta in metas:
+            file_id = self._decode(meta)
+            if file_id is not None:
+                result.append((meta['id'], file_id))
+        return result
+
+    def stats(self) -> dict:
+        return {"loaded": self.loads, "written": self.writes, "pending": len(self._dirty)}
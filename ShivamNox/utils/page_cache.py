@@ -0,0 +1,102 @@
+# (c) ShivamNox - Rendered page cache
+import gzip
+import asyncio
+import hashlib
+import brotli
+from typing import Dict, Hashable, Optional, Tuple
+from ShivamNox.vars import Var
+from .cache import TTLCache
+from .render_template import render_page, template_version
+
+
+class RenderedPage:
+    """One rendered page and its precompressed variants"""
+    __slots__ = ("etag", "variants")
+
+    def __init__(self, html: str):
+        identity = html.encode()
+        self.etag = hashlib.sha1(identity).hexdigest()[:20]
+        self.variants: Dict[str, bytes] = {
+            "identity": identity,
+            "gzip": gzip.compress(identity, compresslevel=9, mtime=0),
+            "br": brotli.compress(identity, mode=brotli.MODE_TEXT, quality=11),
+        }
+
+    def nbytes(self) -> int:
+        return sum(len(body) for body in self.variants.values()) + 128
+
+    def etag_for(self, encoding: str) -> str:
+        return f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+
+    def matches(self, if_none_match: str, encoding: str) -> bool:
+        """
+        Whether the client already holds the ``encoding`` variant.
+
+        Only that variant's ETag counts: a 304 carries the ETag being
+        served, and a cache can't pair it with a different stored variant.
+        """
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag_for(encoding) in tags
+
+
+def pick_encoding(accept_encoding: str) -> str:
+    """Best of br, gzip and identity that the client accepts"""
+    weights: Dict[str, float] = {}
+    for item in (accept_encoding or "").lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            weights[coding.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = "identity", 0.0
+    for coding in ("br", "gzip"):
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class PageCache:
+    """
+    Rendered /watch pages keyed by message id, link hash and template
+    version, stored with their br/gzip variants.
+
+    Only successful renders are kept, so a hash that doesn't match never
+    gets a cached page. Concurrent misses for one page share a render.
+    """
+    def __init__(self, max_bytes: int, ttl: float):
+        self._cache = TTLCache(max_bytes=max_bytes, ttl=ttl, sizeof=RenderedPage.nbytes)
+        self._rendering: Dict[Hashable, asyncio.Task] = {}
+        self.renders = 0
+
+    async def get(self, id: int, secure_hash: Optional[str]) -> RenderedPage:
+        key: Tuple = (int(id), secure_hash, await template_version())
+        page = self._cache.get(key)
+        if page is not None:
+            return page
+        task = self._rendering.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(key, id, secure_hash))
+            self._rendering[key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _render(self, key: Tuple, id: int, secure_hash: Optional[str]) -> RenderedPage:
+        html = await render_page(id, secure_hash)
+        # Brotli at quality 11 is slow, but each page is compressed only once
+        page = await asyncio.to_thread(RenderedPage, html)
+        self.renders += 1
+        self._cache.set(key, page)
+        return page
+
+    def stats(self) -> dict:
+        return {"renders": self.renders, "rendering": len(self._rendering), **self._cache.stats()}
+
+
+page_cache = PageCache(Var.PAGE_CACHE_BYTES, Var.PAGE_CACHE_TTL)
@@ -1,55 +1,64 @@
+import html
+import hashlib
 import urllib.parse
 import aiofiles
-import aiohttp
-import logging
+from typing import Dict, Optional
 from string import Template
 from ShivamNox.vars import Var
-from ShivamNox.bot import StreamBot
 from ShivamNox.utils.human_readable import humanbytes
-from ShivamNox.utils.file_properties import get_file_ids
-from ShivamNox.server.exceptions import InvalidHash
+from ShivamNox.utils.custom_dl import get_verified_file
+
+# Compiled once per process; the files only change with a deploy
+_templates: Dict[str, Template] = {}
+_version: Optional[str] = None
+
+
+async def get_template(name: str) -> Template:
+    template = _templates.get(name)
+    if template is None:
+        async with aiofiles.open(f'ShivamNox/template/{name}') as f:
+            template = _templates[name] = Template(await f.read())
+    return template
+
+
+async def template_version() -> str:
+    """Short digest of the page templates, so a deploy never serves stale pages"""
+    global _version
+    if _version is None:
+        templates = [await get_template(name) for name in ('req.html', 'dl.html')]
+        _version = hashlib.sha1("".join(t.template for t in templates).encode()).hexdigest()[:12]
+    return _version
+
 
 async def render_page(id, secure_hash):
-    try:
-        file_data = await get_file_ids(StreamBot, int(Var.BIN_CHANNEL), int(id))
-
-        if file_data.unique_id[:6] != secure_hash:
-            logging.debug(f'link hash: {secure_hash} - {file_data.unique_id[:6]}')
-            raise InvalidHash
-
-        src = urllib.parse.urljoin(Var.URL, f'{secure_hash}{id}')
-        tag = (file_data.mime_type or 'application/octet-stream').split('/')[0].strip()
-
-        if tag in ('video', 'audio'):
-            async with aiofiles.open('ShivamNox/template/req.html') as f:
-                template = Template(await f.read())
-            heading = f"{'Watch' if tag=='video' else 'Listen'} {file_data.file_name}"
-            
-            # Use safe_substitute instead of substitute
-            html = template.safe_substitute(
-                heading=heading,
-                filename=file_data.file_name,
-                tag=tag,
-                src=src
-            )
-
-        else:
-            async with aiofiles.open('ShivamNox/template/dl.html') as f:
-                template = Template(await f.read())
-            async with aiohttp.ClientSession() as session:
-                async with session.get(src) as resp:
-                    heading = f"Download {file_data.file_name}"
-                    file_size = humanbytes(int(resp.headers.get('Content-Length', 0)))
-                    
-                    html = template.safe_substitute(
-                        heading=heading,
-                        filename=file_data.file_name,
-                        src=src,
-                        filesize=file_size
-                    )
-
-        return html
-
-    except Exception as e:
-        logging.critical(f"Render error: {e}")
-        return f"<h1>Internal Error while rendering page</h1><pre>{e}</pre>"
+    """
+    Watch or download page for a link.
+
+    Size and mime type come from the shared file cache, so a warm page costs
+    no Telegram call. InvalidHash and FIleNotFound reach the caller.
+    """
+    file_data = await get_verified_file(int(id), secure_hash)
+
+    src = urllib.parse.urljoin(Var.URL, f'{secure_hash}{id}')
+    tag = (file_data.mime_type or 'application/octet-stream').split('/')[0].strip()
+    file_name = html.escape(file_data.file_name or "")
+
+    if tag in ('video', 'audio'):
+        template = await get_template('req.html')
+        heading = f"{'Watch' if tag=='video' else 'Listen'} {file_name}"
+
+        # Use safe_substitute instead of substitute
+        return template.safe_substitute(
+            heading=heading,
+            filename=file_name,
+            tag=tag,
+            src=src
+        )
+
+    template = await get_template('dl.html')
+    return template.safe_substitute(
+        heading=f"Download {file_name}",
+        filename=file_name,
+        src=src,
+        filesize=humanbytes(file_data.file_size or 0)
+    )
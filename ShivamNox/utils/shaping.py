@@ -0,0 +1,136 @@
+# (c) ShivamNox - Per-IP and per-link bandwidth shaping
+import time
+import asyncio
+from typing import Dict, Hashable, Optional, Tuple
+from ShivamNox.vars import Var
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class TokenBucket:
+    """
+    Refills at ``rate`` bytes per second up to ``burst``.
+
+    Takers may overdraw it and are told how long to sleep, so any number of
+    streams can share one bucket without a lock and still add up to the rate.
+    """
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: int, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    def take(self, nbytes: int) -> float:
+        """Seconds to wait before sending ``nbytes``"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= nbytes
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+class TrafficClass:
+    """Limits shared by one kind of traffic, e.g. player streams"""
+    def __init__(self, name: str, ip_rate: int, link_rate: int, ip_streams: int):
+        self.name = name
+        self.ip_rate = ip_rate
+        self.link_rate = link_rate
+        self.ip_streams = ip_streams
+        # key -> [bucket or None, open streams]
+        self._ips: Dict[Hashable, list] = {}
+        self._links: Dict[Hashable, list] = {}
+        self.rejected = 0
+        self.throttled = 0.0
+
+    @staticmethod
+    def _enter(table: Dict[Hashable, list], key: Hashable, rate: int) -> Optional[TokenBucket]:
+        entry = table.get(key)
+        if entry is None:
+            bucket = TokenBucket(rate, max(rate, CHUNK_SIZE)) if rate else None
+            entry = table[key] = [bucket, 0]
+        entry[1] += 1
+        return entry[0]
+
+    @staticmethod
+    def _leave(table: Dict[Hashable, list], key: Hashable):
+        entry = table.get(key)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del table[key]
+
+    def open(self, ip: str, link: Hashable) -> Optional["ShapedStream"]:
+        """A shaped stream, or None if this IP already has its share of streams"""
+        entry = self._ips.get(ip)
+        if self.ip_streams and entry is not None and entry[1] >= self.ip_streams:
+            self.rejected += 1
+            return None
+        buckets = (
+            self._enter(self._ips, ip, self.ip_rate),
+            self._enter(self._links, link, self.link_rate),
+        )
+        return ShapedStream(self, ip, link, buckets)
+
+    def stats(self) -> dict:
+        return {
+            "streams": sum(entry[1] for entry in self._ips.values()),
+            "ips": len(self._ips),
+            "links": len(self._links),
+            "rejected": self.rejected,
+            "throttled_s": round(self.throttled, 1),
+        }
+
+
+class ShapedStream:
+    """One stream's share of its IP and link buckets"""
+    __slots__ = ("traffic", "ip", "link", "buckets", "closed")
+
+    def __init__(
+        self,
+        traffic: TrafficClass,
+        ip: str,
+        link: Hashable,
+        buckets: Tuple[Optional[TokenBucket], Optional[TokenBucket]],
+    ):
+        self.traffic = traffic
+        self.ip = ip
+        self.link = link
+        self.buckets = buckets
+        self.closed = False
+
+    async def throttle(self, nbytes: int):
+        """Wait until ``nbytes`` may be sent under every bucket"""
+        delay = max((bucket.take(nbytes) for bucket in self.buckets if bucket), default=0)
+        if delay:
+            self.traffic.throttled += delay
+            await asyncio.sleep(delay)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.traffic._leave(self.traffic._ips, self.ip)
+            self.traffic._leave(self.traffic._links, self.link)
+
+
+class Shaper:
+    """Traffic classes by name: ``watch`` for the player, ``dl`` for downloads"""
+    def __init__(self):
+        self.classes = {
+            "watch": TrafficClass(
+                "watch", Var.WATCH_IP_RATE, Var.WATCH_LINK_RATE, Var.WATCH_IP_STREAMS
+            ),
+            "dl": TrafficClass(
+                "dl", Var.DL_IP_RATE, Var.DL_LINK_RATE, Var.DL_IP_STREAMS
+            ),
+        }
+
+    def open(self, kind: str, ip: str, link: Hashable) -> Optional[ShapedStream]:
+        return self.classes[kind].open(ip, link)
+
+    def stats(self) -> dict:
+        return {name: traffic.stats() for name, traffic in self.classes.items()}
+
+
+shaper = Shaper()
@@ -0,0 +1,75 @@
+# (c) ShivamNox - Single-flight chunk fetching
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+from .cache import TTLCache
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight chunk fetches into one upstream call and
+    keeps the most recently fetched chunks in a small byte-bounded RAM cache.
+
+    The upstream fetch runs as its own task, so a viewer closing the tab
+    doesn't fail the others waiting on the same chunk; it is only cancelled
+    once nobody is waiting for it any more.
+    """
+    def __init__(self, hot_bytes: int, hot_ttl: float = 600):
+        self._hot = TTLCache(max_bytes=hot_bytes, ttl=hot_ttl, sizeof=len)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.fetches = 0
+        self.coalesced = 0
+        self.hot_hits = 0
+
+    def peek(self, key: Hashable) -> Optional[bytes]:
+        """A hot chunk, without counting the lookup in the cache stats"""
+        return self._hot.peek(key)
+
+    async def fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        chunk = self._hot.get(key)
+        if chunk is not None:
+            self.hot_hits += 1
+            return chunk
+
+        flight = self._flights.get(key)
+        if flight is None:
+            self.fetches += 1
+            flight = _Flight(asyncio.ensure_future(fetch()))
+            flight.task.add_done_callback(lambda task, key=key: self._landed(key, task))
+            self._flights[key] = flight
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _landed(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is not None and self._flights[key].task is task:
+            del self._flights[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        chunk = task.result()
+        if chunk:
+            self._hot.set(key, chunk)
+
+    def stats(self) -> dict:
+        return {
+            "upstream_fetches": self.fetches,
+            "saved_fetches": self.coalesced + self.hot_hits,
+            "coalesced": self.coalesced,
+            "hot_hits": self.hot_hits,
+            "in_flight": len(self._flights),
+            "hot_cache": self._hot.stats(),
+        }
@@ -45,3 +45,42 @@ class Var(object):
     DATABASE_URL = str(getenv('DATABASE_URL', ' ')) #Required
     UPDATES_CHANNEL = str(getenv('UPDATES_CHANNEL', ' ')) #Required without @
     BANNED_CHANNELS = list(set(int(x) for x in str(getenv("BANNED_CHANNELS", "-1001362659779")).split())) #Leave as it is.
+
+    # Streaming
+    READ_AHEAD = int(getenv('READ_AHEAD', '4')) #GetFile requests kept in flight per stream.
+    CLIENT_MAX_INFLIGHT = int(getenv('CLIENT_MAX_INFLIGHT', '16')) #GetFile requests one bot may have in flight.
+    STRIPED_DOWNLOAD = getenv('STRIPED_DOWNLOAD', 'False').lower() == 'true'
+    STRIPE_MIN_SIZE = int(getenv('STRIPE_MIN_SIZE', str(32 * 1024 * 1024))) #Smallest response (bytes) to stripe.
+    CACHE_DIR = str(getenv('CACHE_DIR', 'cache')) #Where downloaded chunks are cached on disk.
+    CACHE_MAX_BYTES = int(getenv('CACHE_MAX_BYTES', '0')) #Disk cache budget in bytes, 0 disables it.
+    HOT_CACHE_BYTES = int(getenv('HOT_CACHE_BYTES', str(64 * 1024 * 1024))) #RAM kept for recently fetched chunks.
+    MAX_SESSIONS_PER_DC = int(getenv('MAX_SESSIONS_PER_DC', '3')) #Media connections one bot may open to a DC.
+    PERSIST_MEDIA_AUTH = getenv('PERSIST_MEDIA_AUTH', 'True').lower() == 'true'
+    PREWARM_SESSIONS = getenv('PREWARM_SESSIONS', 'True').lower() == 'true'
+    FAILOVER_DEADLINE = int(getenv('FAILOVER_DEADLINE', '60')) #Seconds to keep refetching a failed chunk.
+    AFFINITY_MAX_STREAMS = int(getenv('AFFINITY_MAX_STREAMS', '8')) #Streams a bot takes before files from its DC spill to other bots.
+    PERSIST_METADATA = getenv('PERSIST_METADATA', 'True').lower() == 'true'
+    METADATA_MAX_AGE = int(getenv('METADATA_MAX_AGE', '86400')) #Seconds a stored FileId is trusted.
+    METADATA_WARM_COUNT = int(getenv('METADATA_WARM_COUNT', '2000')) #Entries loaded into RAM at startup.
+    BATCH_WINDOW_MS = int(getenv('BATCH_WINDOW_MS', '5')) #How long metadata lookups wait to share a get_messages call.
+    FILE_CACHE_BYTES = int(getenv('FILE_CACHE_BYTES', str(16 * 1024 * 1024))) #RAM budget for cached file metadata.
+    NEGATIVE_CACHE_TTL = int(getenv('NEGATIVE_CACHE_TTL', '120')) #Seconds a missing or mis-hashed link is rejected without a lookup.
+    SIGNED_LINKS = getenv('SIGNED_LINKS', 'False').lower() == 'true'
+    LINK_SECRET = str(getenv('LINK_SECRET', '')) #HMAC key for v2 links, derived from BOT_TOKEN if empty.
+    LINK_TTL = int(getenv('LINK_TTL', '0')) #Seconds a v2 link stays valid, 0 never expires.
+    MIN_FETCH_SIZE = int(getenv('MIN_FETCH_SIZE', '4096')) #Smallest GetFile limit for small ranges, 1048576 always fetches whole MBs.
+    INDEX_CACHE_BYTES = int(getenv('INDEX_CACHE_BYTES', str(64 * 1024 * 1024))) #RAM for MP4/MKV headers and seek indexes, 0 disables it.
+    INDEX_MAX_BYTES = int(getenv('INDEX_MAX_BYTES', str(8 * 1024 * 1024))) #Largest moov box or Cues element kept per file.
+    MAX_CONNECTIONS = int(getenv('MAX_CONNECTIONS', '100')) #Streams sent at once.
+    QUEUE_SIZE = int(getenv('QUEUE_SIZE', '200')) #Streams that may wait for a free slot.
+    QUEUE_TIMEOUT = int(getenv('QUEUE_TIMEOUT', '15')) #Seconds a queued stream waits before a 503.
+    TRUST_PROXY = getenv('TRUST_PROXY', str(ON_HEROKU)).lower() == 'true' #Only behind a proxy that sets X-Forwarded-For, or clients can spoof their IP.
+    STREAM_BUFFER_BYTES = int(getenv('STREAM_BUFFER_BYTES', str(256 * 1024 * 1024))) #RAM all streams may hold in fetched but unsent parts, 0 is unlimited.
+    WATCH_IP_RATE = int(getenv('WATCH_IP_RATE', '0')) #Bytes/s one IP may pull for playback, 0 is unlimited.
+    WATCH_LINK_RATE = int(getenv('WATCH_LINK_RATE', '0')) #Bytes/s one file may be played at in total, 0 is unlimited.
+    WATCH_IP_STREAMS = int(getenv('WATCH_IP_STREAMS', '0')) #Playback streams one IP may hold open, 0 is unlimited.
+    DL_IP_RATE = int(getenv('DL_IP_RATE', '0')) #Bytes/s one IP may download, 0 is unlimited.
+    DL_LINK_RATE = int(getenv('DL_LINK_RATE', '0')) #Bytes/s one file may be downloaded at in total, 0 is unlimited.
+    DL_IP_STREAMS = int(getenv('DL_IP_STREAMS', '0')) #Download connections one IP may hold open, 0 is unlimited.
+    PAGE_CACHE_BYTES = int(getenv('PAGE_CACHE_BYTES', str(32 * 1024 * 1024))) #RAM for rendered watch pages and their compressed copies.
+    PAGE_CACHE_TTL = int(getenv('PAGE_CACHE_TTL', '3600')) #Seconds a rendered watch page is reused.